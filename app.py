@@ -1,19 +1,35 @@
 import streamlit as st
-import pandas as pd
-import datetime as dt
 
 # Imports from our new modules
 from utils.auth import require_auth
-# from utils.db import check_db_connection
-from utils.data import load_data, process_data, get_user_col
-from tabs.basic_analytics import render_basic_analytics
-from tabs.advanced_analytics import render_advanced_analytics
+from utils.prewarm import server_prewarm
 
 # ----------------------------- Config & Auth ----------------------------------
 st.set_page_config(page_title="QR Code Analytics", layout="wide")
 
+# Фоновый прогрев набора по умолчанию (utils.prewarm): первый прогон в процессе
+# запускает его, когда форма входа уже нарисована (импорты — в потоке прогрева);
+# при изменении qr_code.csv — пересборка в фоне
+prewarm = server_prewarm()
+
 # Enforce authentication
-require_auth()
+# Вход — до тяжёлых импортов (pandas, pyarrow, вкладки): форма логина после рестарта
+# контейнера рисуется без их загрузки (замер: python -m bench.startup)
+require_auth(on_login_form=prewarm.request)
+prewarm.request()
+
+import pandas as pd
+import datetime as dt
+# from utils.db import check_db_connection
+from utils.data import process_data, shared_dataset, win_date_slice, shared_segments, get_user_col, user_id_columns, filter_dictionaries, WIN_TYPES, START_FROM_STR
+from utils.precompute import precomputed_for, load_tables
+from utils.snapshot import source_version, load_processed
+from utils.bitmaps import shared_bitmaps, select, cardinality, positions
+from utils.memo import pipeline_memo, node
+from utils.store import STORE_DIR, store_exists, read_meta, store_index, prune, region_names, load_partitions, user_scan_counts
+from utils.profiling import start_run, timed, section_laps, render_profile_panel
+
+start_run()
 
 # ----------------------------- Sidebar & Data Loading -------------------------
 st.sidebar.header("Загрузка данных")
@@ -21,27 +37,76 @@ uploaded_file = st.sidebar.file_uploader("Выберите CSV файл", type="
 
 # Button to clear cache
 if st.sidebar.button("Обновить/очистить кэш данных"):
-    load_data.clear()
+    load_tables.clear()
+    store_index.clear()
+    if uploaded_file is None and not store_exists():
+        # набор по умолчанию пересобирается в фоне, сессии пока работают с прежней сборкой
+        prewarm.request(refresh=True)
+    else:
+        filter_dictionaries.clear()
+        shared_dataset.clear()
+        shared_segments.clear()
+        shared_bitmaps.clear()
+        pipeline_memo.clear()
     st.rerun()
+if prewarm.building() and prewarm.published is not None:
+    st.sidebar.caption("Идёт фоновое обновление данных — показана предыдущая версия.")
 
-# Load raw data
-if uploaded_file is not None:
-    raw_df = load_data(uploaded_file)
-else:
-    raw_df = load_data("qr_code.csv")
-
-# Process data (add derived columns)
-df = process_data(raw_df.copy())
+START_FROM = pd.Timestamp(START_FROM_STR, tz="UTC")
+VIEWS = ["Базовая аналитика", "Advanced Analytics"]
+METRICS_SCOPES = ["Текущий срез", "Вся база (с учетом фильтров)"]
+
+# Хранилище по разделам (python -m utils.store): читаются только разделы, нужные странице.
+# Значения виджетов ниже по странице берутся из session_state (текущий прогон):
+#   Advanced Analytics — вся история (когорты, RFM и призы считаются по всему набору),
+#   «Вся база» — всё от START_FROM, иначе — только окно дат слайдера.
+# Сегменты считаются по сканам из хранилища (utils.store.user_scan_counts), а не по загрузке.
+use_store = uploaded_file is None and store_exists()
+if use_store:
+    store_meta = read_meta()
+    store_idx = store_index(STORE_DIR, store_meta["built_at"])
+    store_regions = region_names(store_idx)
+    full_history = st.session_state.get("main_view") == VIEWS[1]
+    load_start, load_end = (None if full_history else START_FROM), None
+    if st.session_state.get("win_range") and not full_history and st.session_state.get("metrics_scope") != METRICS_SCOPES[1]:
+        lo, hi = (pd.Timestamp(v) for v in st.session_state["win_range"])
+        load_start = max(START_FROM, lo.tz_convert("UTC"))
+        load_end = hi.tz_convert("UTC")
+    picked = st.session_state.get("regions")
+    # все регионы = без фильтра по региону: строки без region_id тоже загружаются
+    region_ids = ([rid for name in picked for rid in store_regions.get(name, [])]
+                  if picked and len(picked) < len(store_regions) else None)
+
+# Load + process data: один общий обработанный набор на версию источника для всех
+# сессий процесса (utils.data.shared_dataset); сессия его не меняет, а строит производные кадры
+with timed("load_data") as rec:
+    csv_version = None  # версия qr_code.csv, из которой построен набор (для предрасчёта)
+    if uploaded_file is not None:
+        version_key = ("upload", getattr(uploaded_file, "file_id", None) or uploaded_file.name, uploaded_file.size)
+        df = shared_dataset(version_key, lambda: process_data(pd.read_csv(uploaded_file)))
+    elif use_store:
+        store_parts = prune(store_idx, load_start, load_end, region_ids, undated=full_history)
+        store_paths = tuple(store_parts["path"])
+        version_key = (STORE_DIR, store_meta["built_at"], store_paths)
+        df = shared_dataset(version_key, lambda: process_data(load_partitions(STORE_DIR, store_paths)))
+    else:
+        # прогретая сборка (utils.prewarm); новая версия, если собирается, подменит её по готовности
+        warm = prewarm.current()
+        if warm is not None:
+            version_key, df, csv_version = warm["version_key"], warm["df"], warm["source_version"]
+        else:
+            # снимок Arrow IPC (utils.snapshot) общий для всех серверных процессов на машине
+            csv_version = source_version("qr_code.csv")
+            version_key = ("qr_code.csv", csv_version)
+            df = shared_dataset(version_key, lambda: load_processed("qr_code.csv", csv_version))
+    rec["rows_out"] = len(df)
 
 # ----------------------------- Global Settings & Filters ----------------------
 st.sidebar.header("Фильтры")
 
 # User ID Column Selection
 USER_COL = get_user_col(df)
-candidate_ids = [c for c in df.columns if (
-    c in ["customer_id","user_id","msisdn","phone","user_uuid","uuid"]
-    or c.lower().endswith("_id")
-)]
+candidate_ids = user_id_columns(df.columns)
 if not candidate_ids and USER_COL:
     candidate_ids = [USER_COL]
 if candidate_ids:
@@ -52,86 +117,120 @@ USER_LABEL = USER_COL
 local_tz = st.sidebar.selectbox("Часовой пояс отображения", ["UTC","Asia/Yerevan"], index=1)
 
 # --- 1. Global Segmentation (Pre-Filter) ---
+# assign — новый кадр поверх общих колонок (без копирования данных)
 if USER_COL:
     # Calculate global frequency for segmentation based on FULL data
-    user_freq = df.groupby(USER_COL).size()
-    def _get_segment(c):
-        if c == 1: return "Novice (1 scan)"
-        elif c <= 5: return "Active (2-5 scans)"
-        else: return "Power User (6+ scans)"
-    
-    # Map to dataframe
-    # Use map for speed, fillna for safety
-    df["user_segment"] = df[USER_COL].map(user_freq).fillna(0).apply(_get_segment)
+    scan_counts = (lambda: user_scan_counts(STORE_DIR, USER_COL)) if use_store else None
+    df = df.assign(user_segment=shared_segments(version_key, USER_COL, df[USER_COL], scan_counts))
 else:
-    df["user_segment"] = "Unknown"
+    df = df.assign(user_segment="Unknown")
+
+# Опции фильтров — из словарей, построенных один раз на версию набора данных
+filter_dicts = filter_dictionaries(version_key, df)
 
-# --- 2. Global Filters (Create filtered_df) ---
-filtered_df = df.copy()
+# --- 2. Global Filters ---
+# Выбор фильтров — измерение -> значения; строки отбираются по битовым индексам
+# (utils.bitmaps) только внутри окна дат. Весь отфильтрованный набор строится лишь для Advanced Analytics.
+selections = {}
 
 # A. Region Filter
-if "region_name" in filtered_df.columns:
-    region_values = sorted([x for x in filtered_df["region_name"].unique() if pd.notna(x)])
-    selected_regions = st.sidebar.multiselect("Регионы", region_values, default=region_values)
-    if selected_regions:
-        filtered_df = filtered_df[filtered_df["region_name"].isin(selected_regions)]
+if "region_name" in df.columns:
+    region_values = list(store_regions) if use_store else filter_dicts["regions"]
+    selected_regions = st.sidebar.multiselect("Регионы", region_values, default=region_values, key="regions")
+    if selected_regions and len(selected_regions) < len(region_values):
+        selections["region_name"] = selected_regions
 
 # B. Prize ID Filter (NEW)
-if "prize_id" in filtered_df.columns:
-    all_prizes = filtered_df["prize_id"].dropna().unique()
-    # Convert to string for sorting/display consistency
-    all_prizes_list = sorted([str(p) for p in all_prizes])
-    if all_prizes_list:
-        selected_prizes = st.sidebar.multiselect("Фильтр по prize_id", all_prizes_list, default=[])
+if "prize_id" in df.columns:
+    prize_codes = filter_dicts["prizes"]
+    if prize_codes:
+        selected_prizes = st.sidebar.multiselect("Фильтр по prize_id", list(prize_codes), default=[])
         if selected_prizes:
-            # Filter converting column to string to match selection
-            filtered_df = filtered_df[filtered_df["prize_id"].astype(str).isin(selected_prizes)]
+            # Целочисленные коды prize_code вместо подписей
+            selections["prize_id"] = [prize_codes[p] for p in selected_prizes]
 
 # C. User Segment Filter (NEW)
 if USER_COL:
-    all_segments = sorted(filtered_df["user_segment"].unique())
+    all_segments = filter_dicts["segments"]
     selected_segments = st.sidebar.multiselect("Сегмент пользователей", all_segments, default=[])
     if selected_segments:
-        filtered_df = filtered_df[filtered_df["user_segment"].isin(selected_segments)]
+        selections["user_segment"] = selected_segments
 
 # D. Win Type Filter
-win_type_values = ["real_prize","points","no_win"]
+win_type_values = WIN_TYPES
 selected_win_types = st.sidebar.multiselect("Тип выигрыша", win_type_values, default=win_type_values)
-filtered_df = filtered_df[filtered_df["win_type"].isin(selected_win_types)]
+if len(selected_win_types) < len(win_type_values):
+    selections["win_type"] = selected_win_types
 
 # E. Received Filter
 received_filter = st.sidebar.selectbox("Получение приза (is_win_received)", ["Все","Только получен","Не получен"])
 if received_filter == "Только получен":
-    filtered_df = filtered_df[filtered_df["is_win_received"]]
+    selections["is_win_received"] = [True]
 elif received_filter == "Не получен":
-    filtered_df = filtered_df[~filtered_df["is_win_received"]]
+    selections["is_win_received"] = [False]
+
+# Состояние фильтров — часть ключей узлов мемо-графа (utils.memo): кадры и разделы
+# пересчитываются только когда меняются входы, от которых они зависят
+filter_key = (version_key, USER_COL, tuple(sorted((dim, tuple(sorted(v))) for dim, v in selections.items())))
+
+filter_bits = None
+if selections:
+    with timed("filter.bitmaps") as rec:
+        filter_bits = node(("filter_bits", filter_key),
+                           lambda: select(shared_bitmaps(version_key, USER_COL, df), selections, len(df)))
+        rec["rows_out"] = cardinality(filter_bits)
+    # мощность выборки по всему набору — popcount карты, без отбора строк
+    loaded = "загруженные разделы" if use_store else "вся база"
+    st.sidebar.caption(f"Строк под фильтрами ({loaded}): {rec['rows_out']}")
+
+def filtered_rows(rows: slice) -> pd.DataFrame:
+    """Строки df в срезе по позициям rows, прошедшие фильтры сайдбара (один take)."""
+    if filter_bits is None:
+        return df.iloc[rows]
+    with timed("filter.take", rows_in=len(range(len(df))[rows])) as rec:
+        out = df.take(positions(filter_bits, rows))
+        rec["rows_out"] = len(out)
+    return out
+
+def window_key(rows: slice) -> tuple:
+    return ("window", filter_key, local_tz, rows.start, rows.stop)
+
+def window_frame(rows: slice) -> pd.DataFrame:
+    """Окно rows (позиции в df) после фильтров, win_date — в поясе отображения."""
+    def build():
+        out = filtered_rows(rows)
+        if local_tz != "UTC":
+            out = out.assign(win_date=out["win_date"].dt.tz_convert(local_tz))
+        return out
+    return node(window_key(rows), build)
 
 # --- 3. Date Filtering (Create work) ---
-# Hardcoded start date
-START_FROM_STR = "2025-09-15"
-START_FROM = pd.Timestamp(START_FROM_STR, tz="UTC")
-
 if "win_date" not in df.columns:
     st.error("Колонка win_date отсутствует — временные графики недоступны.")
     st.stop()
 
-# Prepare working dataset from filtered_df
-work = filtered_df.copy()
-work = work.dropna(subset=["win_date"])
-
-if local_tz != "UTC":
-    work["win_date"] = work["win_date"].dt.tz_convert(local_tz)
-    start_dt_local = START_FROM.tz_convert(local_tz)
-else:
-    start_dt_local = START_FROM
+# df упорядочен по win_date (process_data): окно от START_FROM — срез по позициям
+with timed("filter.start_from", rows_in=len(df)) as rec:
+    start_rows = win_date_slice(df, start=START_FROM)
+    work, work_key = window_frame(start_rows), window_key(start_rows)
+    start_dt_local = START_FROM.tz_convert(local_tz) if local_tz != "UTC" else START_FROM
+    rec["rows_out"] = len(work)
 
-# Filter by hardcoded start date
-work = work[work["win_date"] >= start_dt_local]
+# Всё окно от START_FROM (до слайдера) — база для «Вся база (с учетом фильтров)»
+since_start, since_start_key = work, work_key
 
 # Slider for date range
+if use_store and not work.empty:
+    # границы слайдера — из статистик разделов, а не из уже суженной загрузки
+    bounds = prune(store_idx, START_FROM, None, region_ids)
+    actual_min = bounds["win_min"].min().tz_convert(start_dt_local.tz)
+    actual_max = bounds["win_max"].max().tz_convert(start_dt_local.tz)
+elif not work.empty:
+    # work упорядочен по win_date
+    actual_min = work["win_date"].iloc[0]
+    actual_max = work["win_date"].iloc[-1]
+
 if not work.empty:
-    actual_min = work["win_date"].min()
-    actual_max = work["win_date"].max()
 
     slider_min = max(start_dt_local, actual_min)
     slider_max = actual_max
@@ -145,7 +244,8 @@ if not work.empty:
         min_value=slider_min.to_pydatetime(),
         max_value=slider_max.to_pydatetime(),
         value=(slider_min.to_pydatetime(), slider_max.to_pydatetime()),
-        format="DD.MM.YYYY"
+        format="DD.MM.YYYY",
+        key="win_range"
     )
 
     # Apply slider filter
@@ -159,8 +259,17 @@ if not work.empty:
     tzinfo_w = slider_min.tz
     w_start = _ensure_tz_runtime(win_range[0], tzinfo_w)
     w_end   = _ensure_tz_runtime(win_range[1], tzinfo_w)
-    work = work[(work["win_date"] >= w_start) & (work["win_date"] <= w_end)]
+    with timed("filter.date_range", rows_in=len(work)) as rec:
+        # w_start >= START_FROM, поэтому срез по df лежит внутри окна от START_FROM
+        date_rows = win_date_slice(df, w_start, w_end)
+        work, work_key = window_frame(date_rows), window_key(date_rows)
+        rec["rows_out"] = len(work)
+    range_full = w_start <= slider_min and w_end >= slider_max.floor("us")
+    if use_store and ((load_start is not None and w_start < load_start) or (load_end is not None and w_end > load_end)):
+        # слайдер расширен (или сброшен) за пределы загруженных разделов — догружаем
+        st.rerun()
 else:
+    range_full = True
     st.warning("Нет данных после 15.09.2025 в текущих фильтрах.")
 
 # Aggregation Settings (for Basic Analytics)
@@ -168,46 +277,82 @@ mode_unique = st.sidebar.toggle("Считать уникальных польз
 gran = st.sidebar.radio("Гранулярность", ["Day","Week","Month"], horizontal=True)
 
 # Metrics Scope
-metrics_scope = st.sidebar.radio("Область метрик", ["Текущий срез", "Вся база (с учетом фильтров)"], index=0)
-if metrics_scope == "Текущий срез":
-    metrics_df = work
+metrics_scope = st.sidebar.radio("Область метрик", METRICS_SCOPES, index=0, key="metrics_scope")
+if metrics_scope == METRICS_SCOPES[0]:
+    metrics_df, metrics_key = work, work_key
 else:
-    # Use filtered_df instead of raw df to respect Region/Prize/Segment filters
-    metrics_df = filtered_df.copy()
-    metrics_df = metrics_df.dropna(subset=["win_date"])
-    if local_tz != "UTC":
-        metrics_df["win_date"] = metrics_df["win_date"].dt.tz_convert(local_tz)
-    metrics_df = metrics_df[metrics_df["win_date"] >= start_dt_local]
+    # Region/Prize/Segment-фильтры уже применены к окну от START_FROM
+    metrics_df, metrics_key = since_start, since_start_key
+memo_keys = {"work": work_key, "metrics": metrics_key}
+
+# Предрасчитанные таблицы (python -m utils.precompute) — только для фильтров по умолчанию.
+filters_default = not selections
+# ключ набора, как его записывает python -m utils.precompute (имя файла, число строк),
+# и версия файла: при той же длине, но другом содержимом предрасчёт не подходит
+dataset_key = (getattr(uploaded_file, "file_id", None) or getattr(uploaded_file, "name", None) or "qr_code.csv", len(df))
+if use_store:
+    dataset_key = version_key
+pre = precomputed_for(dataset_key, USER_COL, local_tz, csv_version) if filters_default else None
+# pre_key — версия таблиц pre (ключ их содержимого для постраничных таблиц и выгрузок)
+pre_key = ("precomputed", dataset_key, csv_version, USER_COL, local_tz)
+if pre is None and filters_default:
+    # таблицы вида по умолчанию, построенные фоновым прогревом
+    pre = prewarm.tables_for(version_key, USER_COL, local_tz)
+    pre_key = ("prewarm", version_key, USER_COL, local_tz)
+pre_basic = pre if (range_full and metrics_scope == METRICS_SCOPES[0]) else None
 
 # ----------------------------- Main UI ----------------------------------------
 st.title("QR Code Analytics")
 
-# Tabs
-tab_basic, tab_advanced = st.tabs(["Базовая аналитика", "Advanced Analytics"])
-
-with tab_basic:
-    render_basic_analytics(
-        df=df,
-        work=work,
-        metrics_df=metrics_df,
-        USER_COL=USER_COL,
-        USER_LABEL=USER_LABEL,
-        local_tz=local_tz,
-        gran=gran,
-        mode_unique=mode_unique,
-        metrics_scope=metrics_scope,
-        start_dt_local=start_dt_local
-    )
-
-with tab_advanced:
-    render_advanced_analytics(
-        df=filtered_df,
-        work=work,
-        metrics_df=metrics_df,
-        USER_COL=USER_COL,
-        local_tz=local_tz
-    )
+# Tabs: st.tabs исполняет тела всех вкладок на каждом rerun, поэтому
+# переключатель рендерит только выбранный раздел.
+view = st.radio(
+    "Раздел",
+    VIEWS,
+    horizontal=True,
+    key="main_view",
+    label_visibility="collapsed"
+)
+
+# Модуль вкладки импортируется, только когда она выбрана
+if view == VIEWS[0]:
+    from tabs.basic_analytics import render_basic_analytics
+    with section_laps("basic"):
+        render_basic_analytics(
+            df=df,
+            work=work,
+            metrics_df=metrics_df,
+            USER_COL=USER_COL,
+            USER_LABEL=USER_LABEL,
+            local_tz=local_tz,
+            gran=gran,
+            mode_unique=mode_unique,
+            metrics_scope=metrics_scope,
+            start_dt_local=start_dt_local,
+            pre=pre_basic,
+            memo_keys={**memo_keys, "pre": pre_key}
+        )
+else:
+    from tabs.advanced_analytics import render_advanced_analytics
+    with section_laps("advanced"):
+        render_advanced_analytics(
+            df=node(("filtered", filter_key), lambda: filtered_rows(slice(0, len(df)))),
+            work=work,
+            metrics_df=metrics_df,
+            USER_COL=USER_COL,
+            local_tz=local_tz,
+            pre=pre,
+            memo_keys={**memo_keys, "df": ("filtered", filter_key)}
+        )
 
 # ----------------------------- Footer / DB Check ------------------------------
 st.divider()
-# check_db_connection()
\ No newline at end of file
+# check_db_connection()
+
+# ----------------------------- Debug: profiler --------------------------------
+if st.sidebar.toggle("Профилировщик (debug)", value=False, key="profiler_panel"):
+    with st.sidebar.expander("Время по этапам", expanded=True):
+        render_profile_panel()
+        memo = pipeline_memo().stats()
+        st.caption(f"Мемо-граф: {memo['entries']} узлов, {memo['used_mb']} / {memo['budget_mb']} MB, "
+                   f"попаданий {memo['hits']}, промахов {memo['misses']}")
\ No newline at end of file
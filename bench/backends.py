@@ -0,0 +1,71 @@
+"""
+Сверка и замер движков utils.backend на синтетических данных.
+
+    python -m bench.backends --rows 1000000
+
+Каждая операция считается на pandas и на DuckDB; расхождение — assert_frame_equal
+с кодом возврата 1.
+"""
+import sys
+import argparse
+import pandas as pd
+
+from bench.benchmarks import build_inputs, _raw, _time, LOCAL_TZ
+from utils import backend
+from utils.helpers import aggregate_time
+from utils.analytics import cohort_retention, rfm_table, user_activity_table
+
+def backend_cases(inputs: dict) -> dict:
+    df, work, user_col = inputs["df"], inputs["work"], inputs["user_col"]
+    cases = {
+        f"aggregate_time.{gran.lower()}_{'unique' if unique else 'events'}":
+            (lambda gran=gran, unique=unique: aggregate_time(work, "win_date", gran, unique, LOCAL_TZ, user_col))
+        for gran in ["Day", "Week", "Month"] for unique in [False, True]
+    }
+    cases["cohort_retention"] = lambda: _raw(cohort_retention)(df[[user_col, "win_date"]], user_col, LOCAL_TZ)
+    cases["rfm_table"] = lambda: _raw(rfm_table)(df[[user_col, "win_date", "is_real_prize"]], user_col)
+    cases["user_activity_table"] = lambda: user_activity_table(work, user_col, LOCAL_TZ)
+    return cases
+
+def _assert_same(name: str, expected, actual):
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, obj=name)
+    else:
+        pd.testing.assert_frame_equal(expected, actual, obj=name)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сверка движков pandas / DuckDB")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    engines = [b for b in backend.available_backends() if b != "pandas"]
+    if not engines:
+        print("Нет альтернативных движков (pip install duckdb)")
+        return 0
+
+    inputs = build_inputs(args.rows)
+    cases = backend_cases(inputs)
+    failed = []
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"{'case':<30}{'pandas':>10}" + "".join(f"{e:>10}" for e in engines))
+    for name, fn in cases.items():
+        backend.set_backend("pandas")
+        expected = fn()
+        timings = [_time(fn, args.repeat)]
+        for engine in engines:
+            backend.set_backend(engine)
+            try:
+                _assert_same(name, expected, fn())
+            except AssertionError as e:
+                failed.append(f"{name} [{engine}]: {e}")
+            timings.append(_time(fn, args.repeat))
+        backend.set_backend(None)
+        print(f"{name:<30}" + "".join(f"{t:>10.4f}" for t in timings))
+
+    for f in failed:
+        print("MISMATCH", f)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
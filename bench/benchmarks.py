@@ -0,0 +1,125 @@
+"""
+Бенчмарки горячих расчётов на синтетических данных (bench/synthetic.py).
+
+    python -m bench.benchmarks --rows 200000                # прогон и сравнение с baseline
+    python -m bench.benchmarks --rows 200000 --save-baseline
+    python -m bench.benchmarks --rows 200000 --check        # код 1 при регрессии
+
+Время — минимум из --repeat запусков. Функции под st.cache_data вызываются
+через __wrapped__, чтобы мерить расчёт, а не попадание в кэш.
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+from pathlib import Path
+import pandas as pd
+
+from bench.synthetic import generate_qr_codes
+from utils.data import process_data, get_user_col
+from utils.helpers import aggregate_time
+from utils.analytics import cohort_retention, user_activity_table, user_span_table, count_full_weeks
+from utils.goose import DEFAULT_STAGES, simulate_goose
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+LOCAL_TZ = "Asia/Yerevan"
+
+def _raw(fn):
+    return getattr(fn, "__wrapped__", fn)
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def build_inputs(n_rows: int, seed: int = 0) -> dict:
+    """Сырые строки (через CSV, как их читает load_data) и обработанный набор."""
+    buf = io.StringIO()
+    generate_qr_codes(n_rows, seed=seed).to_csv(buf, index=False)
+    buf.seek(0)
+    raw = pd.read_csv(buf)
+    df = process_data(raw.copy())
+    user_col = get_user_col(df)
+    work = df.dropna(subset=["win_date"]).copy()
+    work["win_date"] = work["win_date"].dt.tz_convert(LOCAL_TZ)
+    return {"raw": raw, "df": df, "work": work, "user_col": user_col}
+
+def benchmark_cases(inputs: dict) -> dict:
+    """Имя -> функция без аргументов. Подготовка входов не входит в замер."""
+    raw, df, work, user_col = inputs["raw"], inputs["df"], inputs["work"], inputs["user_col"]
+    base = work[[user_col, "win_date"]]
+    spans = _raw(user_span_table)(base, user_col, True)
+
+    return {
+        "process_data": lambda: process_data(raw.copy()),
+        "aggregate_time.day_events": lambda: aggregate_time(work, "win_date", "Day", False, LOCAL_TZ, user_col),
+        "aggregate_time.week_unique": lambda: aggregate_time(work, "win_date", "Week", True, LOCAL_TZ, user_col),
+        "cohort_retention": lambda: _raw(cohort_retention)(df[[user_col, "win_date"]], user_col, LOCAL_TZ),
+        "user_activity_table": lambda: user_activity_table(work, user_col, LOCAL_TZ),
+        "user_span_table": lambda: _raw(user_span_table)(base, user_col, True),
+        "count_full_weeks": lambda: count_full_weeks(spans["first_day"], spans["last_day"]),
+        "simulate_goose.x20": lambda: [
+            simulate_goose(weekly_pts=float(w), stages=DEFAULT_STAGES, max_days=365)
+            for w in range(1, 21)
+        ],
+    }
+
+def load_baseline(path: Path, n_rows: int) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text()).get(str(n_rows), {}).get("results", {})
+
+def save_baseline(path: Path, n_rows: int, results: dict):
+    data = json.loads(path.read_text()) if path.exists() else {}
+    data[str(n_rows)] = {
+        "results": {k: round(v, 5) for k, v in results.items()},
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки аналитики QR Code")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="Запустить только перечисленные кейсы")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Вернуть код 1, если кейс медленнее baseline × tolerance")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    inputs = build_inputs(args.rows)
+    cases = benchmark_cases(inputs)
+    if args.only:
+        cases = {k: v for k, v in cases.items() if k in args.only}
+
+    baseline = load_baseline(args.baseline, args.rows)
+    results, regressions = {}, []
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"{'case':<28}{'seconds':>10}{'baseline':>10}{'ratio':>8}")
+    for name, fn in cases.items():
+        sec = _time(fn, args.repeat)
+        results[name] = sec
+        ref = baseline.get(name)
+        ratio = sec / ref if ref else None
+        if ratio is not None and ratio > args.tolerance:
+            regressions.append(name)
+        print(f"{name:<28}{sec:>10.4f}{(ref or float('nan')):>10.4f}{(ratio or float('nan')):>8.2f}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, args.rows, results)
+        print(f"baseline saved: {args.baseline}")
+    if args.check and regressions:
+        print("regressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Сверка и замер пакетного симулятора гуся (utils.goose.simulate_goose_batch) и перемотки
+(simulate_goose(fast_forward=True)) с обычным проходом по дням.
+
+    python -m bench.goose --scenarios 300 --grid 20000 --horizon 3650
+
+Случайные сценарии во всех режимах (начисление, тип недельного значения, ежедневный
+визит, бонус) считаются обоими способами; любое расхождение поля summary — код 1.
+"""
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+
+from utils.goose import (
+    DEFAULT_STAGES, STAGE_ORDER, scenario_grid, scenario_stages, simulate_goose, simulate_goose_batch,
+)
+
+MODES = list(itertools.product(["daily", "weekly"], ["points", "feeds"], [True, False], [True, False]))
+
+def random_scenarios(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {
+        "weekly_pts": rng.choice([0.0, 0.5, 1.0, 2.0, 3.5, 5.0, 7.0, 10.0, 20.0, 60.0], n),
+        "max_paid_feeds_per_day": rng.integers(0, 15, n),
+        # стартовый голод для сверки перемотки; 0 — гибель в первый же день
+        "start_hunger": rng.choice([0, 1, 3, 5, 25], n),
+    }
+    for stage in STAGE_ORDER:
+        data[f"{stage}_hunger_cap"] = rng.integers(1, 25, n)
+        data[f"{stage}_size_cap"] = rng.integers(1, 25, n)
+        data[f"{stage}_daily_hunger_loss"] = rng.integers(0, 4, n)
+        data[f"{stage}_stageup_bonus_pts"] = rng.integers(0, 15, n)
+    return pd.DataFrame(data)
+
+def _same(a, b) -> bool:
+    if a is None or b is None or pd.isna(a) or pd.isna(b):
+        return (a is None or pd.isna(a)) and (b is None or pd.isna(b))
+    return a == b
+
+def check_equivalence(scenarios: pd.DataFrame, max_days: int, start_hunger: int = 3, start_size: int = 1) -> list[str]:
+    """Расхождения batch и скалярного simulate_goose по всем MODES."""
+    failed = []
+    for accrual, value_mode, visit, bonus in MODES:
+        opts = dict(accrual_mode=accrual, weekly_value_mode=value_mode, visit_daily=visit,
+                    add_stageup_bonus_to_wallet=bonus, start_hunger=start_hunger, start_size=start_size,
+                    max_days=max_days)
+        batch = simulate_goose_batch(scenarios, **opts)
+        for i, row in scenarios.iterrows():
+            _, expected = simulate_goose(
+                weekly_pts=float(row["weekly_pts"]), stages=scenario_stages(row),
+                max_paid_feeds_per_day=int(row["max_paid_feeds_per_day"]), **opts
+            )
+            got = batch.loc[i]
+            diff = [k for k, v in expected.items() if not _same(v, got[k])]
+            if diff:
+                failed.append(f"{opts} scenario {i}: " + ", ".join(f"{k} {expected[k]!r} != {got[k]!r}" for k in diff))
+    return failed
+
+def check_fast_forward(scenarios: pd.DataFrame, max_days: int) -> list[str]:
+    """Расхождения summary с перемоткой и без, плюс согласованность лога по отрезкам."""
+    failed = []
+    for accrual, value_mode, visit, bonus in MODES:
+        for i, row in scenarios.iterrows():
+            kw = dict(weekly_pts=float(row["weekly_pts"]), stages=scenario_stages(row),
+                      max_paid_feeds_per_day=int(row["max_paid_feeds_per_day"]), accrual_mode=accrual,
+                      weekly_value_mode=value_mode, visit_daily=visit, add_stageup_bonus_to_wallet=bonus,
+                      start_hunger=int(row["start_hunger"]), max_days=max_days)
+            _, expected = simulate_goose(**kw)
+            runs, got = simulate_goose(**kw, fast_forward=True)
+            diff = [k for k, v in expected.items() if not _same(v, got[k]) or type(v) is not type(got[k])]
+            if runs["days"].sum() != expected["days_run"] or runs["paid_spent"].sum() != expected["total_paid_spent"]:
+                diff.append("log")
+            if diff:
+                failed.append(f"{kw['accrual_mode']}/{kw['weekly_value_mode']} visit={visit} bonus={bonus} "
+                              f"scenario {i}: {', '.join(diff)}")
+    return failed
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сверка и замер пакетного симулятора")
+    parser.add_argument("--scenarios", type=int, default=200, help="Случайных сценариев на режим для сверки")
+    parser.add_argument("--grid", type=int, default=20_000, help="Размер сетки для замера")
+    parser.add_argument("--max-days", type=int, default=365)
+    parser.add_argument("--horizon", type=int, default=3650, help="Горизонт (дней) для сверки и замера перемотки")
+    args = parser.parse_args(argv)
+
+    failed = check_equivalence(random_scenarios(args.scenarios), args.max_days)
+    failed += check_equivalence(random_scenarios(args.scenarios, seed=1), args.max_days, start_hunger=25, start_size=0)
+    failed += check_equivalence(random_scenarios(args.scenarios, seed=3), args.max_days, start_hunger=0)
+    print(f"equivalence: {len(MODES)} modes x {args.scenarios * 3} scenarios, mismatches: {len(failed)}")
+    ff_failed = check_fast_forward(random_scenarios(args.scenarios, seed=2), args.horizon)
+    print(f"fast_forward: {len(MODES)} modes x {args.scenarios} scenarios, horizon {args.horizon}, "
+          f"mismatches: {len(ff_failed)}")
+    failed += ff_failed
+    for f in failed[:20]:
+        print("MISMATCH", f)
+
+    side = max(1, int(round(args.grid ** 0.5)))
+    grid = scenario_grid(DEFAULT_STAGES, weekly_pts=np.linspace(0.5, 30, side),
+                         max_paid_feeds_per_day=np.arange(side) % 20)
+    t0 = time.perf_counter()
+    simulate_goose_batch(grid, max_days=args.max_days)
+    batch_sec = time.perf_counter() - t0
+    sample = grid.sample(min(200, len(grid)), random_state=0)
+    t0 = time.perf_counter()
+    for _, row in sample.iterrows():
+        simulate_goose(weekly_pts=float(row["weekly_pts"]), stages=scenario_stages(row),
+                       max_paid_feeds_per_day=int(row["max_paid_feeds_per_day"]), max_days=args.max_days)
+    scalar_sec = (time.perf_counter() - t0) / len(sample) * len(grid)
+    print(f"grid={len(grid)} batch={batch_sec:.3f}s scalar~{scalar_sec:.3f}s (extrapolated) x{scalar_sec / batch_sec:.1f}")
+
+    # перемотка: медленный доход и крупные этапы — рост годами упирается в кошелёк
+    slow = scenario_grid(DEFAULT_STAGES, weekly_pts=np.linspace(0.02, 1.0, 20), max_paid_feeds_per_day=[0, 2, 10],
+                         **{f"{s}_size_cap": [DEFAULT_STAGES[s].size_cap * 4] for s in STAGE_ORDER})
+    timings = {}
+    for ff in (False, True):
+        t0 = time.perf_counter()
+        for accrual in ("daily", "weekly"):
+            for _, row in slow.iterrows():
+                simulate_goose(weekly_pts=float(row["weekly_pts"]), stages=scenario_stages(row),
+                               max_paid_feeds_per_day=int(row["max_paid_feeds_per_day"]), accrual_mode=accrual,
+                               max_days=args.horizon, fast_forward=ff)
+        timings[ff] = time.perf_counter() - t0
+    print(f"horizon={args.horizon} days, {2 * len(slow)} scenarios: by day={timings[False]:.3f}s "
+          f"fast_forward={timings[True]:.3f}s x{timings[False] / timings[True]:.1f}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Холодный старт: время импортов и первой отрисовки (форма входа) в свежем процессе.
+
+    python -m bench.startup                   # отчёт по импортам + первая отрисовка
+    python -m bench.startup --top 20 --repeat 5
+
+Каждый замер — отдельный интерпретатор (как после рестарта контейнера).
+Отчёт по импортам — python -X importtime, суммарно по пакетам верхнего уровня.
+Тяжёлые модули учитываются по потоку, который их загрузил: фоновый прогрев
+(utils.prewarm) грузит их сам и должен стартовать только после отрисовки формы
+(иначе — код 1, как и при загрузке тяжёлых модулей самим скриптом).
+"""
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Модули, которые не должны загружаться до входа
+HEAVY = ["pandas", "numpy", "pyarrow", "altair", "sqlalchemy", "sshtunnel", "duckdb"]
+
+_LOGIN_PAINT = """
+import sys, json, time, threading
+first_import = {{}}  # пакет верхнего уровня -> имя потока, который его загрузил
+marks = {{}}         # момент кнопки входа и первого импорта потока прогрева
+THREAD_NAME = None  # имя потока прогрева; задаётся импортом utils.prewarm ниже
+def _audit(event, args):
+    if event == "import":
+        name = threading.current_thread().name
+        first_import.setdefault(args[0].split(".")[0], name)
+        if name == THREAD_NAME:
+            marks.setdefault("prewarm", time.perf_counter())
+sys.addaudithook(_audit)
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from utils.prewarm import THREAD_NAME
+_button = st.button
+def _login_button(*args, **kwargs):
+    marks.setdefault("form", time.perf_counter())
+    return _button(*args, **kwargs)
+st.button = _login_button
+at = AppTest.from_file({app!r}, default_timeout=120)
+t0 = time.perf_counter()
+at.run()
+print(json.dumps({{
+    "seconds": time.perf_counter() - t0,
+    "login_form": any(t.label == "Пароль" for t in at.text_input),
+    "loaded": [m for m in {heavy!r} if m in first_import and first_import[m] != THREAD_NAME],
+    "prewarm": [m for m in {heavy!r} if first_import.get(m) == THREAD_NAME],
+    "prewarm_before_form": marks.get("prewarm", float("inf")) < marks.get("form", float("inf")),
+}}))
+"""
+
+def _python(code: str, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+def import_report(modules: list[str]) -> list[tuple[str, float]]:
+    """(пакет верхнего уровня, секунды cumulative) по убыванию для import modules."""
+    proc = _python("; ".join(f"import {m}" for m in modules), "-X", "importtime")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            depth = len(name) - len(name.lstrip(" "))
+            rows.append((depth, name.strip().split(".")[0], int(cumulative) / 1e6))
+    # importtime печатает потомков раньше родителя; в обратном порядке родитель идёт первым.
+    # Пакет считается один раз — по внешнему импорту (без предка из того же пакета).
+    totals, stack = {}, []
+    for depth, top, sec in reversed(rows):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if top not in {t for _, t in stack}:
+            totals[top] = totals.get(top, 0) + sec
+        stack.append((depth, top))
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+def login_paint() -> dict:
+    """Первый прогон app.py без входа в свежем процессе."""
+    proc = _python(_LOGIN_PAINT.format(app=str(ROOT / "app.py"), heavy=HEAVY))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Холодный старт: импорты и первая отрисовка")
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modules", nargs="*", default=["utils.auth", "tabs.basic_analytics", "tabs.advanced_analytics"],
+                        help="Модули для отчёта по импортам")
+    args = parser.parse_args(argv)
+
+    print(f"imports: {' '.join(args.modules)}")
+    print(f"{'package':<28}{'seconds':>10}")
+    for name, sec in import_report(args.modules)[:args.top]:
+        print(f"{name:<28}{sec:>10.3f}")
+
+    runs = [login_paint() for _ in range(args.repeat)]
+    best = min(r["seconds"] for r in runs)
+    print(f"\nlogin paint (min of {args.repeat}): {best:.3f} s")
+    print(f"login form shown: {all(r['login_form'] for r in runs)}")
+    loaded = runs[-1]["loaded"]
+    print(f"heavy modules loaded before login: {', '.join(loaded) or '-'}")
+    print(f"loaded by background prewarm: {', '.join(runs[-1]['prewarm']) or '-'}")
+    early = any(r["prewarm_before_form"] for r in runs)
+    print(f"prewarm started before login form: {'yes' if early else 'no'}")
+    return 1 if loaded or early else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Сверка хранилища по разделам (utils.store) с чтением qr_code.csv целиком.
+
+    python -m bench.store --rows 50000
+
+Синтетический набор (bench/synthetic.py) кладётся во временный каталог дважды: как CSV
+и как хранилище. Страница app.py прогоняется в свежем процессе на каждом из них
+с одинаковыми фильтрами (сегмент, суженное окно дат, область метрик, Advanced Analytics);
+любое расхождение метрик на странице — код 1.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import datetime as dt
+import subprocess
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+ROOT = Path(__file__).resolve().parent.parent
+_TZ = ZoneInfo("Asia/Yerevan")
+_WINDOW = (dt.datetime(2025, 10, 20, tzinfo=_TZ), dt.datetime(2025, 11, 5, tzinfo=_TZ))
+
+# Сценарий -> шаги (ключ или подпись виджета, значение); после каждого шага — прогон страницы
+SCENARIOS = {
+    "power_users": [("Сегмент пользователей", ["Power User (6+ scans)"])],
+    "power_users_window": [("Сегмент пользователей", ["Power User (6+ scans)"]), ("win_range", _WINDOW)],
+    "active_window_all_time": [("Сегмент пользователей", ["Active (2-5 scans)"]), ("win_range", _WINDOW),
+                               ("metrics_scope", "Вся база (с учетом фильтров)")],
+    "novice_armenia_advanced": [("Сегмент пользователей", ["Novice (1 scan)"]), ("regions", ["Armenia"]),
+                                ("win_range", _WINDOW), ("main_view", "Advanced Analytics"),
+                                ("adv_claim", True), ("adv_normalized", True)],
+}
+
+def _set(at, target: str, value):
+    widgets = [w for kind in (at.multiselect, at.slider, at.radio, at.toggle) for w in kind]
+    widget = next(w for w in widgets if target in (w.key, w.label))
+    widget.set_value(value).run()
+
+def page_metrics() -> dict:
+    """Метрики страницы по сценариям; app.py читает данные из текущего каталога."""
+    from streamlit.testing.v1 import AppTest
+    out = {}
+    for name, steps in SCENARIOS.items():
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+        at.session_state["authenticated"] = True
+        at.run()
+        for target, value in steps:
+            _set(at, target, value)
+        errors = [e.message for e in at.exception]
+        out[name] = {"metrics": [[m.label, m.value] for m in at.metric], "errors": errors}
+    return out
+
+def _run_page(cwd: Path) -> dict:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    proc = subprocess.run([sys.executable, "-m", "bench.store", "--page"], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сверка страницы с хранилищем и без")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--page", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.page:
+        print(json.dumps(page_metrics(), ensure_ascii=False))
+        return 0
+
+    from bench.synthetic import generate_qr_codes
+    from utils.store import write_store
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir, store_dir = Path(tmp, "csv"), Path(tmp, "store")
+        csv_dir.mkdir()
+        store_dir.mkdir()
+        generate_qr_codes(args.rows, seed=0).to_csv(csv_dir / "qr_code.csv", index=False)
+        write_store(pd.read_csv(csv_dir / "qr_code.csv"), str(store_dir / "qr_store"))
+        expected, got = _run_page(csv_dir), _run_page(store_dir)
+
+    failed = []
+    for name in SCENARIOS:
+        a, b = expected[name], got[name]
+        if a["errors"] or b["errors"]:
+            failed.append(f"{name}: exceptions {a['errors'] + b['errors']}")
+        diff = [f"{x[0]}: {x[1]} != {y[1]}" for x, y in zip(a["metrics"], b["metrics"]) if x != y]
+        if len(a["metrics"]) != len(b["metrics"]):
+            diff.append(f"{len(a['metrics'])} metrics != {len(b['metrics'])}")
+        print(f"{name:<28} metrics={len(a['metrics']):>3} mismatches={len(diff)}")
+        failed += [f"{name}: {d}" for d in diff]
+    for f in failed[:20]:
+        print("MISMATCH", f)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Синтетические строки таблицы qr_code с той же семантикой, что ожидает process_data:
+win_date (UTC), prize_id (пусто = очки), is_win_received, region_id (1/2),
+prize_receive_date для выданных real prizes.
+
+    python -m bench.synthetic --rows 1000000 --out qr_code.csv
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+# Доли часов суток (Asia/Yerevan, UTC+4): ночью мало сканов, пик вечером
+_HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 6, 7, 7, 7, 7, 8, 9, 10, 10, 9, 7, 4, 2], dtype=float)
+_DOW_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.05, 1.15, 1.3, 1.2])
+
+def generate_qr_codes(
+    n_rows: int,
+    n_users: int | None = None,
+    start: str = "2025-08-01",
+    days: int = 180,
+    real_prize_rate: float = 0.2,
+    n_prizes: int = 12,
+    received_rate: float = 0.7,
+    missing_win_rate: float = 0.01,
+    user_skew: float = 0.7,
+    seed: int = 0,
+    id_offset: int = 0,
+) -> pd.DataFrame:
+    """
+    n_rows строк сканов. Пользователи распределены по Ципфу с показателем user_skew
+    (несколько «power users» и длинный хвост разовых), регион закреплён за пользователем.
+    """
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(1, n_rows // 8)
+
+    # Ранговое распределение Ципфа по конечному числу пользователей
+    ranks = np.arange(1, n_users + 1, dtype=float)
+    p_user = ranks ** -user_skew
+    p_user /= p_user.sum()
+    user_idx = rng.choice(n_users, size=n_rows, p=p_user)
+    customer_id = 100_000 + user_idx
+
+    # Регион закреплён за пользователем детерминированно (одинаково во всех частях файла)
+    region_id = np.where((user_idx * 2654435761) % 100 < 65, 2, 1)
+
+    # День: равномерно по периоду с поправкой на день недели; час — по профилю суток (локальное время)
+    start_ts = pd.Timestamp(start, tz="Asia/Yerevan")
+    day_offsets = np.arange(days)
+    dow = (start_ts.dayofweek + day_offsets) % 7
+    p_day = _DOW_WEIGHTS[dow] * np.linspace(0.6, 1.4, days)  # аудитория растёт
+    p_day /= p_day.sum()
+    day = rng.choice(days, size=n_rows, p=p_day)
+    hour = rng.choice(24, size=n_rows, p=_HOUR_WEIGHTS / _HOUR_WEIGHTS.sum())
+    seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, size=n_rows)
+    win_date = (start_ts + pd.to_timedelta(seconds, unit="s")).tz_convert("UTC")
+    win_date = pd.Series(win_date).where(rng.random(n_rows) >= missing_win_rate)
+
+    # Призы: популярность prize_id убывает геометрически
+    is_real = rng.random(n_rows) < real_prize_rate
+    p_prize = 0.8 ** np.arange(n_prizes)
+    p_prize /= p_prize.sum()
+    prize_id = np.where(is_real, rng.choice(n_prizes, size=n_rows, p=p_prize) + 1, np.nan)
+
+    # Очки «получены» сразу; real prize — с вероятностью received_rate и задержкой
+    received = np.where(is_real, rng.random(n_rows) < received_rate, True)
+    delay_h = rng.lognormal(mean=2.5, sigma=1.2, size=n_rows)
+    receive_date = (win_date + pd.to_timedelta(delay_h, unit="h")).where(is_real & received)
+
+    return pd.DataFrame({
+        "id": np.arange(id_offset, id_offset + n_rows),
+        "customer_id": customer_id,
+        "region_id": region_id,
+        "win_date": win_date,
+        "prize_id": pd.array(prize_id, dtype="Int64"),
+        "is_win_received": received,
+        "prize_receive_date": receive_date,
+        "created_date": win_date,
+    })
+
+def write_qr_codes(path: str, n_rows: int, chunk_rows: int = 1_000_000, seed: int = 0, **kwargs):
+    """Пишет n_rows строк частями (CSV или Parquet по расширению), чтобы 50M не держать в памяти."""
+    kwargs.setdefault("n_users", None)
+    kwargs["n_users"] = kwargs["n_users"] or max(1, n_rows // 8)
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for i, start in enumerate(range(0, n_rows, chunk_rows)):
+                part = generate_qr_codes(min(chunk_rows, n_rows - start), seed=seed + i, id_offset=start, **kwargs)
+                table = pa.Table.from_pandas(part, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        part = generate_qr_codes(min(chunk_rows, n_rows - start), seed=seed + i, id_offset=start, **kwargs)
+        part.to_csv(path, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических строк qr_code")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--out", default="qr_code.csv")
+    args = parser.parse_args()
+    write_qr_codes(args.out, args.rows, chunk_rows=args.chunk_rows, seed=args.seed,
+                   n_users=args.users, days=args.days)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,133 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
 from utils.helpers import aggregate_time, safe_rate
+from utils.prizes import compute_prize_stats
+from utils.export import export_download
+from utils.user_index import build_user_index, PHONE_COLS
+from utils.charts import cap_events, lttb
+from utils.tables import paged_table
+from utils.profiling import lap
+from utils.analytics import user_activity_table, key_metrics, pending_users_table, time_of_day
+from utils.precompute import time_series_from
+from utils.parallel import Task
+from utils.memo import node, node_key, run_sections_memo
+
+@st.fragment
+def render_prize_probabilities(metrics_df, pre=None, prize_stats=None, metrics_key=None, pre_key=None):
+    # Фрагмент: смена разреза перезапускает только этот блок
+    slice_label = st.radio("Разрез", ["Без разреза", "По регионам", "По неделям"], horizontal=True, key="prize_slice")
+    slice_by = {"Без разреза": (), "По регионам": ("region",), "По неделям": ("week",)}[slice_label]
+    if pre is not None and not slice_by:
+        prob_df, prob_key = pre["prize_stats"], node_key("prize_stats", pre_key)
+    elif prize_stats is not None and not slice_by:
+        prob_df, prob_key = prize_stats, node_key("prize_stats", metrics_key)
+    else:
+        prob_df, prob_key = compute_prize_stats(metrics_df, by=slice_by), node_key("prize_stats", metrics_key, slice_by)
+    if not prob_df.empty:
+        show_cols = prob_df.copy()
+        for c in ["p_per_scan","share_among_real","received_share_in_prize","unclaimed_rate",
+                  "p_per_scan_ci_low","p_per_scan_ci_high","unclaimed_ci_low","unclaimed_ci_high"]:
+            show_cols[c] = (show_cols[c] * 100).round(3)
+        st.dataframe(show_cols, use_container_width=True)
+        export_download("вероятности по prize_id", prob_df, "prize_probabilities", data_key=prob_key)
+    else:
+        st.info("Нет real prizes в текущей области метрик.")
+
+@st.fragment
+def render_user_history(work, user_index, USER_COL, USER_LABEL, work_key=None):
+    # Фрагмент: выбор пользователя перезапускает только этот блок
+    col_uh1, col_uh2 = st.columns([1,2])
+    query = col_uh1.text_input(f"Поиск по {USER_LABEL} или телефону", key="user_search",
+                               help="Совпадение по началу id, затем по подстроке id/телефона.")
+    matches = user_index.search(query, limit=50)
+    exact = user_index.resolve(query) if query else None
+    if exact is not None and exact not in matches:
+        matches.insert(0, exact)
+    user_id_value = col_uh2.selectbox("Выбери пользователя", matches,
+                                      index=0 if matches else None,
+                                      help=f"Первые 50 совпадений из {len(user_index)} пользователей.")
+
+    if user_id_value is not None:
+        import altair as alt  # altair — только когда график действительно рисуется
+        # строки пользователя уже упорядочены по win_date в индексе
+        user_df = work.iloc[user_index.rows(user_id_value)]
+        if user_df.empty:
+            st.warning("Нет событий для этого пользователя (с учётом фильтров).")
+        else:
+            # при очень длинной истории события сворачиваются в корзины по времени
+            plot_cols = [c for c in ["win_date", "win_type", "is_real_prize", "is_point_win",
+                                     "is_win_received", "prize_id"] if c in user_df.columns]
+            user_plot = cap_events(user_df[plot_cols], "win_date", "win_type")
+            if len(user_plot) == len(user_df):
+                tooltip = [
+                    alt.Tooltip("win_date:T", title="Дата"),
+                    alt.Tooltip("win_type:N", title="Тип"),
+                    alt.Tooltip("is_real_prize:N", title="Real prize"),
+                    alt.Tooltip("is_point_win:N", title="Points"),
+                    alt.Tooltip("is_win_received:N", title="Получен"),
+                    alt.Tooltip("prize_id:N", title="prize_id")
+                ]
+            else:
+                tooltip = [
+                    alt.Tooltip("win_date:T", title="Период"),
+                    alt.Tooltip("win_type:N", title="Тип"),
+                    alt.Tooltip("count:Q", title="Событий")
+                ]
+            base_user = alt.Chart(user_plot).encode(
+                x=alt.X("win_date:T", title="Дата (win_date)"),
+                color=alt.Color("win_type:N", title="Тип"),
+                shape=alt.Shape("win_type:N", title="Тип"),
+                tooltip=tooltip
+            )
+            timeline = base_user.mark_point(size=140, filled=True).properties(
+                height=160, width="container", title=f"События пользователя {user_id_value}"
+            )
+            st.altair_chart(timeline, use_container_width=True)
+
+            with st.expander("Сырые строки пользователя"):
+                base_cols = [
+                    USER_COL, "region_name", "win_type", "is_win_received",
+                    "is_real_prize", "is_point_win", "win_date",
+                    "prize_receive_date", "prize_delivery_date", "prize_id"
+                ]
+                seen = set()
+                show_cols = [c for c in base_cols if c in user_df.columns and not (c in seen or seen.add(c))]
+                paged_table(user_df[show_cols], key="user_rows_table", sort_by="win_date", ascending=True,
+                            data_key=node_key("user_rows", work_key, user_id_value, tuple(show_cols)))
+
+def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz, gran, mode_unique, metrics_scope, start_dt_local, pre=None, memo_keys=None):
+    # pre — таблицы utils.precompute для фильтров по умолчанию (None = считать вживую)
+    # memo_keys — ключи кадров work / metrics_df в мемо-графе (utils.memo) и версии таблиц pre;
+    # без них всё считается заново
+    work_key = (memo_keys or {}).get("work")
+    metrics_key = (memo_keys or {}).get("metrics")
+    pre_key = (memo_keys or {}).get("pre")
+    # Таблицы активности и вероятностей независимы — считаются одним пакетом (utils.parallel)
+    tasks, keys = {}, {}
+    if pre is None:
+        if USER_COL and "win_date" in metrics_df.columns:
+            activity_cols = [USER_COL, "win_date", "has_win", "is_real_prize"]
+            tasks["activity"] = Task(user_activity_table, (metrics_df[activity_cols],), (USER_COL, local_tz))
+            keys["activity"] = node_key("activity", metrics_key)
+        if "prize_id" in metrics_df.columns:
+            prize_cols = ["prize_id", "is_real_prize", "is_real_prize_received"]
+            tasks["prizes"] = Task(compute_prize_stats, (metrics_df[prize_cols],))
+            keys["prizes"] = node_key("prize_stats", metrics_key)
+    sections = run_sections_memo(tasks, keys)
 
-def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz, gran, mode_unique, metrics_scope, start_dt_local):
     # ----------------------------- Metrics Summary (всё по win_date) --------------
+    lap("key_metrics")
     st.subheader("Ключевые метрики")
 
-    total_events = len(metrics_df)
-    unique_users = metrics_df[USER_COL].nunique() if USER_COL else None
+    kpi = pre["kpis"] if pre is not None else node(node_key("key_metrics", metrics_key),
+                                                    lambda: key_metrics(metrics_df, USER_COL))
+    total_events = kpi["events"]
+    unique_users = kpi["unique_users"]
 
-    wins_total = metrics_df["has_win"].sum()
-    real_prizes_total = metrics_df["is_real_prize"].sum()
-    real_prizes_received = (metrics_df["is_real_prize"] & metrics_df["is_win_received"]).sum()
-    real_prizes_pending = metrics_df["is_real_prize_pending"].sum()  # считаем напрямую
+    wins_total = kpi["wins_total"]
+    real_prizes_total = kpi["real_prizes_total"]
+    real_prizes_received = kpi["real_prizes_received"]
+    real_prizes_pending = kpi["real_prizes_pending"]  # считаем напрямую
 
     col_m1, col_m2, col_m3, col_m4, col_m5, col_m6 = st.columns(6)
     col_m1.metric("Событий", int(total_events))
@@ -31,11 +145,17 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
     c2d.metric("Ожидают выдачи", f"{safe_rate(real_prizes_pending, real_prizes_total):.2%}")
 
     # ----------------------------- Time Series (по win_date) ----------------------
+    lap("time_series")
     st.subheader("Динамика")
+    import altair as alt  # altair — только когда график действительно рисуется
 
-    ts_events = aggregate_time(work, "win_date", gran, mode_unique, local_tz, USER_COL)
+    if pre is not None:
+        ts_events = time_series_from(pre, "events", gran, mode_unique)
+    else:
+        ts_events = node(node_key("ts_events", work_key, gran, mode_unique),
+                         lambda: aggregate_time(work, "win_date", gran, mode_unique, local_tz, USER_COL))
     metric_label = "Уникальные пользователи (win_date)" if mode_unique else "События (win_date)"
-    chart_events = alt.Chart(ts_events).mark_line(point=True).encode(
+    chart_events = alt.Chart(lttb(ts_events, "date", "count")).mark_line(point=True).encode(
         x=alt.X("date:T", title="Дата", axis=alt.Axis(format="%d.%m", labelAngle=-35)),
         y=alt.Y("count:Q", title=metric_label),
         tooltip=[alt.Tooltip("date:T", title="Дата"),
@@ -43,10 +163,13 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
     ).properties(height=280, title="События по времени (win_date)")
     st.altair_chart(chart_events, use_container_width=True)
 
-    work_real = work[work["is_real_prize"]]
-    ts_real = aggregate_time(work_real, "win_date", gran, mode_unique, local_tz, USER_COL)
+    if pre is not None:
+        ts_real = time_series_from(pre, "real", gran, mode_unique)
+    else:
+        ts_real = node(node_key("ts_real", work_key, gran, mode_unique),
+                       lambda: aggregate_time(work[work["is_real_prize"]], "win_date", gran, mode_unique, local_tz, USER_COL))
     real_label = "Уникальные пользователи с real prize" if mode_unique else "Real prizes (события)"
-    chart_real = alt.Chart(ts_real).mark_line(point=True, color="#ff7f0e").encode(
+    chart_real = alt.Chart(lttb(ts_real, "date", "count")).mark_line(point=True, color="#ff7f0e").encode(
         x=alt.X("date:T", title="Дата", axis=alt.Axis(format="%d.%m", labelAngle=-35)),
         y=alt.Y("count:Q", title=real_label),
         tooltip=[alt.Tooltip("date:T", title="Дата"),
@@ -61,29 +184,24 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
         st.write("Real prizes tail:", ts_real.tail(5))
 
     # ----------------------------- Users: winners / received / pending ------------
+    lap("users_pending")
     st.subheader("Пользователи: выигрыши и получение")
 
     if USER_COL:
-        users_won_any = metrics_df.loc[metrics_df["has_win"], USER_COL].dropna().nunique()
-        users_received_any = metrics_df.loc[metrics_df["is_win_received"], USER_COL].dropna().nunique()
-
-        pending_df = metrics_df[metrics_df["is_real_prize_pending"]].copy()
-        received_real_df = metrics_df[metrics_df["is_real_prize_received"]].copy()
+        users_won_any = kpi["users_won_any"]
+        users_received_any = kpi["users_received_any"]
 
-        # считаем уникальных ожидающих строго по pending_df
-        pending_unique_users = int(pending_df[USER_COL].dropna().nunique())
-        pending_events = int(pending_df.shape[0])
+        pending_df = metrics_df[metrics_df["is_real_prize_pending"]]
+        pending_events = int(real_prizes_pending)
 
         # детальная таблица по ожидающим
-        pending_counts = pending_df.groupby(USER_COL).size().rename("pending_real_prizes")
-        received_before_counts = received_real_df.groupby(USER_COL).size().rename("received_real_before_count")
-        pending_users_table = pd.concat([pending_counts, received_before_counts], axis=1).fillna(0)
-        pending_users_table["received_real_before_count"] = pending_users_table["received_real_before_count"].astype(int)
-        pending_users_table["has_received_real_before"] = pending_users_table["received_real_before_count"] > 0
-        pending_users_table = pending_users_table.reset_index()
+        pending_key = node_key("pending_users", pre_key if pre is not None else metrics_key)
+        pending_users = pre["pending_users"] if pre is not None else node(
+            pending_key, lambda: pending_users_table(metrics_df, USER_COL))
 
-        users_pending_real_count = pending_unique_users
-        users_pending_but_ever_received_real = int(pending_users_table["has_received_real_before"].sum())
+        # считаем уникальных ожидающих строго по pending-событиям
+        users_pending_real_count = int((pending_users["pending_real_prizes"] > 0).sum())
+        users_pending_but_ever_received_real = int(pending_users["has_received_real_before"].sum())
 
         c3a, c3b, c3c, c3d = st.columns(4)
         c3a.metric("Уникальных победителей (любой выигрыш)", int(users_won_any))
@@ -98,21 +216,13 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
                 "Поле идентификатора": USER_COL,
                 "Область метрик": metrics_scope
             })
-            st.dataframe(pending_users_table.sort_values("pending_real_prizes", ascending=False).head(20), use_container_width=True)
+            paged_table(pending_users, key="pending_users_table", sort_by="pending_real_prizes", page_size=20,
+                        data_key=pending_key)
 
             # выгрузки для сверки 1:1
-            st.download_button(
-                "Скачать все pending-события (CSV)",
-                pending_df.to_csv(index=False).encode("utf-8"),
-                file_name="pending_events.csv",
-                mime="text/csv"
-            )
-            st.download_button(
-                "Скачать список пользователей с ожиданием (CSV)",
-                pending_users_table.to_csv(index=False).encode("utf-8"),
-                file_name="pending_users.csv",
-                mime="text/csv"
-            )
+            export_download("все pending-события", pending_df, "pending_events",
+                            data_key=node_key("pending_events", metrics_key))
+            export_download("список пользователей с ожиданием", pending_users, "pending_users", data_key=pending_key)
 
             if users_pending_real_count > pending_events:
                 st.error(
@@ -124,15 +234,13 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
         st.info(f"Колонка идентификатора пользователя ({USER_LABEL}) отсутствует — пользовательские метрики недоступны.")
 
     # ----------------------------- Time-of-day analysis (win_date) ----------------
+    lap("time_of_day")
     st.subheader("Аналитика по времени суток (win_date)")
 
     if not work.empty:
-        work["hour"] = work["win_date"].dt.hour
-        work["dow"] = work["win_date"].dt.dayofweek  # 0=Mon ... 6=Sun
+        hour_df, heat_df = (pre["hours"], pre["heatmap"]) if pre is not None else node(
+            node_key("time_of_day", work_key), lambda: time_of_day(work))
         # 1) Бар по часам
-        hour_counts = work["hour"].value_counts().sort_index()
-        hour_df = hour_counts.reset_index()
-        hour_df.columns = ["hour","count"]
         chart_hour = alt.Chart(hour_df).mark_bar().encode(
             x=alt.X("hour:O", title="Час суток", sort=list(range(24))),
             y=alt.Y("count:Q", title="События"),
@@ -141,7 +249,6 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
         st.altair_chart(chart_hour, use_container_width=True)
 
         # 2) Теплокарта День недели × Час
-        heat_df = work.groupby(["dow","hour"]).size().reset_index(name="count")
         chart_heat = alt.Chart(heat_df).mark_rect().encode(
             x=alt.X("hour:O", title="Час", sort=list(range(24))),
             y=alt.Y("dow:O", title="День недели",
@@ -157,153 +264,45 @@ def render_basic_analytics(df, work, metrics_df, USER_COL, USER_LABEL, local_tz,
         st.info("Нет данных для анализа времени суток после фильтров.")
 
     # ----------------------------- Prize probabilities per prize_id ---------------
+    lap("prize_probabilities")
     st.subheader("Вероятности по каждому prize_id")
 
-    den_scans = len(metrics_df)
-    real_by_prize = (
-        metrics_df[metrics_df["is_real_prize"]]
-        .groupby("prize_id")
-        .size()
-        .reset_index(name="real_prize_count")
-        .sort_values("real_prize_count", ascending=False)
-    )
-    if not real_by_prize.empty:
-        total_real = int(real_by_prize["real_prize_count"].sum())
-        received_by_prize = (
-            metrics_df[metrics_df["is_real_prize_received"]]
-            .groupby("prize_id")
-            .size()
-            .reindex(real_by_prize["prize_id"])
-            .fillna(0)
-            .astype(int)
-            .reset_index(name="received_count")
-        )
-        prob_df = real_by_prize.merge(received_by_prize, on="prize_id", how="left")
-        prob_df["p_per_scan"] = prob_df["real_prize_count"] / max(den_scans, 1)
-        prob_df["share_among_real"] = prob_df["real_prize_count"] / max(total_real, 1)
-        prob_df["received_share_in_prize"] = prob_df["received_count"] / prob_df["real_prize_count"]
-        show_cols = prob_df.copy()
-        for c in ["p_per_scan","share_among_real","received_share_in_prize"]:
-            show_cols[c] = (show_cols[c] * 100).round(3)
-        st.dataframe(show_cols, use_container_width=True)
-        st.download_button(
-            "Скачать вероятности по prize_id (CSV)",
-            prob_df.to_csv(index=False).encode("utf-8"),
-            file_name="prize_probabilities.csv",
-            mime="text/csv"
-        )
-    else:
-        st.info("Нет real prizes в текущей области метрик.")
+    render_prize_probabilities(metrics_df, pre, sections.get("prizes"), metrics_key, pre_key)
 
     # ----------------------------- User activity (на win_date) --------------------
+    lap("user_activity")
     st.subheader("Активность пользователей")
 
     if USER_COL and "win_date" in metrics_df.columns:
-        tmp = metrics_df.dropna(subset=["win_date"]).copy()
-        if local_tz != "UTC":
-            tmp["win_date"] = tmp["win_date"].dt.tz_convert(local_tz)
-
-        scans_per_user = tmp.groupby(USER_COL).size().rename("scans")
-        wins_any_per_user = metrics_df.groupby(USER_COL)["has_win"].sum().rename("wins_any")
-        real_prizes_per_user = metrics_df.groupby(USER_COL)["is_real_prize"].sum().rename("real_prizes")
-
-        tmp = tmp.sort_values([USER_COL, "win_date"])
-        tmp["prev"] = tmp.groupby(USER_COL)["win_date"].shift(1)
-        tmp["delta_hours"] = (tmp["win_date"] - tmp["prev"]).dt.total_seconds() / 3600.0
-        delta_stats = tmp.groupby(USER_COL)["delta_hours"].agg(
-            avg_hours_between_scans="mean",
-            median_hours_between_scans="median"
-        )
-        activity = pd.concat([scans_per_user, wins_any_per_user, real_prizes_per_user, delta_stats], axis=1).fillna(0)
-        activity["avg_days_between_scans"] = (activity["avg_hours_between_scans"] / 24).round(2)
-        activity["avg_hours_between_scans"] = activity["avg_hours_between_scans"].round(2)
-        activity["median_hours_between_scans"] = activity["median_hours_between_scans"].round(2)
-        activity = activity.reset_index().sort_values(["scans","wins_any","real_prizes"], ascending=False)
-
-        st.dataframe(activity, use_container_width=True, height=420)
-        st.download_button(
-            "Скачать активность пользователей (CSV)",
-            activity.to_csv(index=False).encode("utf-8"),
-            file_name="user_activity.csv",
-            mime="text/csv"
-        )
+        activity = pre["activity"] if pre is not None else sections["activity"]
+        activity_key = node_key("activity", pre_key) if pre is not None else keys["activity"]
+
+        paged_table(activity, key="activity_table", sort_by="scans", height=420, data_key=activity_key)
+        export_download("активность пользователей", activity, "user_activity", data_key=activity_key)
     else:
         st.info(f"Нужны {USER_LABEL} и win_date для расчёта активности.")
 
     # ----------------------------- User History (ось = win_date) ------------------
+    lap("user_history")
     st.subheader("История пользователя")
 
     if USER_COL and not work.empty:
-        user_list = sorted(work[USER_COL].dropna().unique())
-        col_uh1, col_uh2 = st.columns([2,1])
-        selected_user = col_uh1.selectbox("Выбери пользователя", user_list if len(user_list) <= 5000 else [],
-                                          index=0 if len(user_list) else None,
-                                          help="Если список слишком большой, используй поле справа.")
-        manual_user = col_uh2.text_input(f"Или введи {USER_LABEL} вручную")
-        if manual_user:
-            if work[USER_COL].dtype.kind in ("i","u"):
-                try:
-                    manual_id_cast = int(manual_user)
-                except:
-                    manual_id_cast = manual_user
-            else:
-                manual_id_cast = manual_user
-            user_id_value = manual_id_cast
-        else:
-            user_id_value = selected_user
-
-        if user_id_value is not None:
-            user_df = work[work[USER_COL] == user_id_value].copy()
-            if user_df.empty:
-                st.warning("Нет событий для этого пользователя (с учётом фильтров).")
-            else:
-                user_df = user_df.sort_values(by="win_date")
-                base_user = alt.Chart(user_df).encode(
-                    x=alt.X("win_date:T", title="Дата (win_date)"),
-                    color=alt.Color("win_type:N", title="Тип"),
-                    shape=alt.Shape("win_type:N", title="Тип"),
-                    tooltip=[
-                        alt.Tooltip("win_date:T", title="Дата"),
-                        alt.Tooltip("win_type:N", title="Тип"),
-                        alt.Tooltip("is_real_prize:N", title="Real prize"),
-                        alt.Tooltip("is_point_win:N", title="Points"),
-                        alt.Tooltip("is_win_received:N", title="Получен"),
-                        alt.Tooltip("prize_id:N", title="prize_id")
-                    ]
-                )
-                timeline = base_user.mark_point(size=140, filled=True).properties(
-                    height=160, width="container", title=f"События пользователя {user_id_value}"
-                )
-                st.altair_chart(timeline, use_container_width=True)
-
-                with st.expander("Сырые строки пользователя"):
-                    base_cols = [
-                        USER_COL, "region_name", "win_type", "is_win_received",
-                        "is_real_prize", "is_point_win", "win_date",
-                        "prize_receive_date", "prize_delivery_date", "prize_id"
-                    ]
-                    seen = set()
-                    show_cols = [c for c in base_cols if c in user_df.columns and not (c in seen or seen.add(c))]
-                    st.dataframe(user_df[show_cols])
+        index_cols = [c for c in [USER_COL, "win_date", *PHONE_COLS] if c in work.columns]
+        user_index = build_user_index(work[list(dict.fromkeys(index_cols))], USER_COL)
+        render_user_history(work, user_index, USER_COL, USER_LABEL, work_key)
     else:
         st.info("Колонка идентификатора пользователя не найдена — история пользователя недоступна.")
 
     # ----------------------------- Export -----------------------------------------
+    lap("export")
     with st.expander("Экспорт агрегированных данных (Time Series)"):
+        ts_base = pre_key if pre is not None else work_key
         ts_export = ts_events.copy()
         ts_export["date"] = ts_export["date"].dt.strftime("%Y-%m-%d %H:%M:%S")
         st.dataframe(ts_export)
-        st.download_button(
-            "Скачать Time Series (events, win_date) CSV",
-            data=ts_export.to_csv(index=False).encode("utf-8"),
-            file_name="timeseries_events_win_date.csv",
-            mime="text/csv"
-        )
+        export_download("Time Series (events, win_date)", ts_export, "timeseries_events_win_date",
+                        data_key=node_key("ts_events_export", ts_base, gran, mode_unique))
         ts_real_export = ts_real.copy()
         ts_real_export["date"] = ts_real_export["date"].dt.strftime("%Y-%m-%d %H:%M:%S")
-        st.download_button(
-            "Скачать Time Series (real prizes, win_date) CSV",
-            data=ts_real_export.to_csv(index=False).encode("utf-8"),
-            file_name="timeseries_real_prizes_win_date.csv",
-            mime="text/csv"
-        )
+        export_download("Time Series (real prizes, win_date)", ts_real_export, "timeseries_real_prizes_win_date",
+                        data_key=node_key("ts_real_export", ts_base, gran, mode_unique))
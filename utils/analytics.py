@@ -0,0 +1,196 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from utils import backend
+
+# Тяжёлые расчёты вкладок. Вынесены из UI (и кэшируются, где это окупается),
+# чтобы повторное открытие раздела не пересчитывало их с нуля.
+
+@st.cache_data(show_spinner=False)
+def cohort_retention(df: pd.DataFrame, user_col: str, local_tz: str) -> pd.DataFrame:
+    """Доля вернувшихся пользователей по недельным когортам первого скана."""
+    cohort_data = df.dropna(subset=["win_date"]).copy()
+    if local_tz != "UTC":
+        cohort_data["win_date"] = cohort_data["win_date"].dt.tz_convert(local_tz)
+
+    if backend.get_backend() == "duckdb":
+        cohort_counts = backend.cohort_counts(cohort_data["win_date"], cohort_data[user_col])
+        cohort_pivot = cohort_counts.pivot(index="cohort_week", columns="weeks_since_first", values="users")
+        return cohort_pivot.divide(cohort_pivot.iloc[:, 0], axis=0)
+
+    user_first_scan = cohort_data.groupby(user_col)["win_date"].min().reset_index()
+    user_first_scan.columns = [user_col, "first_scan"]
+
+    cohort_data = cohort_data.merge(user_first_scan, on=user_col)
+
+    cohort_data["cohort_week"] = cohort_data["first_scan"].dt.to_period("W").dt.start_time
+    cohort_data["activity_week"] = cohort_data["win_date"].dt.to_period("W").dt.start_time
+
+    cohort_data["weeks_since_first"] = (
+        (cohort_data["activity_week"] - cohort_data["cohort_week"]).dt.days // 7
+    ).astype(int)
+
+    cohort_counts = cohort_data.groupby(["cohort_week", "weeks_since_first"])[user_col].nunique().reset_index()
+    cohort_pivot = cohort_counts.pivot(index="cohort_week", columns="weeks_since_first", values=user_col)
+
+    cohort_size = cohort_pivot.iloc[:, 0]
+    return cohort_pivot.divide(cohort_size, axis=0)
+
+@st.cache_data(show_spinner=False)
+def claim_hours(df: pd.DataFrame) -> pd.Series:
+    """Часы от выигрыша до получения для выданных real prizes."""
+    claim_data = df[
+        df["is_real_prize"] &
+        df["is_win_received"] &
+        df["prize_receive_date"].notna() &
+        df["win_date"].notna()
+    ]
+    hours = (claim_data["prize_receive_date"] - claim_data["win_date"]).dt.total_seconds() / 3600.0
+    return hours[hours >= 0].rename("hours_to_claim")
+
+@st.cache_data(show_spinner=False)
+def rfm_table(df: pd.DataFrame, user_col: str) -> pd.DataFrame:
+    """Recency/frequency/real prizes по пользователю с сегментом по частоте."""
+    rfm_data = df.dropna(subset=["win_date"])
+    last_scan_date = rfm_data["win_date"].max()
+
+    if backend.get_backend() == "duckdb":
+        rfm = backend.per_user_rfm(rfm_data, user_col)
+    else:
+        rfm = rfm_data.groupby(user_col).agg(
+            last_scan=("win_date", "max"),
+            frequency=("win_date", "count"),
+            real_prizes=("is_real_prize", "sum")
+        ).reset_index()
+
+    rfm["recency_days"] = (last_scan_date - rfm["last_scan"]).dt.days
+    rfm["segment"] = np.select(
+        [rfm["frequency"] == 1, rfm["frequency"] <= 5],
+        ["Novice (1 scan)", "Active (2-5 scans)"],
+        default="Power User (6+ scans)"
+    )
+    return rfm
+
+def user_activity_table(df: pd.DataFrame, user_col: str, local_tz: str) -> pd.DataFrame:
+    """Сканы, выигрыши, real prizes и интервалы между сканами по пользователю."""
+    if backend.get_backend() == "duckdb":
+        # интервалы между сканами не зависят от пояса: перевод в local_tz не нужен
+        activity = backend.per_user_activity(df, user_col).fillna(0)
+    else:
+        tmp = df.dropna(subset=["win_date"]).copy()
+        if local_tz != "UTC":
+            tmp["win_date"] = tmp["win_date"].dt.tz_convert(local_tz)
+
+        scans_per_user = tmp.groupby(user_col).size().rename("scans")
+        wins_any_per_user = df.groupby(user_col)["has_win"].sum().rename("wins_any")
+        real_prizes_per_user = df.groupby(user_col)["is_real_prize"].sum().rename("real_prizes")
+
+        tmp = tmp.sort_values([user_col, "win_date"])
+        tmp["prev"] = tmp.groupby(user_col)["win_date"].shift(1)
+        tmp["delta_hours"] = (tmp["win_date"] - tmp["prev"]).dt.total_seconds() / 3600.0
+        delta_stats = tmp.groupby(user_col)["delta_hours"].agg(
+            avg_hours_between_scans="mean",
+            median_hours_between_scans="median"
+        )
+        activity = pd.concat([scans_per_user, wins_any_per_user, real_prizes_per_user, delta_stats], axis=1).fillna(0)
+    activity["avg_days_between_scans"] = (activity["avg_hours_between_scans"] / 24).round(2)
+    activity["avg_hours_between_scans"] = activity["avg_hours_between_scans"].round(2)
+    activity["median_hours_between_scans"] = activity["median_hours_between_scans"].round(2)
+    activity = activity.reset_index().sort_values(["scans","wins_any","real_prizes"], ascending=False)
+    return activity
+
+def key_metrics(df: pd.DataFrame, user_col) -> dict:
+    """Счётчики блока «Ключевые метрики» и «Пользователи: выигрыши и получение»."""
+    kpi = {
+        "events": len(df),
+        "unique_users": int(df[user_col].nunique()) if user_col else None,
+        "wins_total": int(df["has_win"].sum()),
+        "real_prizes_total": int(df["is_real_prize"].sum()),
+        "real_prizes_received": int((df["is_real_prize"] & df["is_win_received"]).sum()),
+        "real_prizes_pending": int(df["is_real_prize_pending"].sum()),
+    }
+    if user_col:
+        kpi["users_won_any"] = int(df.loc[df["has_win"], user_col].dropna().nunique())
+        kpi["users_received_any"] = int(df.loc[df["is_win_received"], user_col].dropna().nunique())
+    return kpi
+
+def pending_users_table(df: pd.DataFrame, user_col: str) -> pd.DataFrame:
+    """Пользователи с невыданными real prizes и сколько real prizes им уже выдано."""
+    pending_counts = df[df["is_real_prize_pending"]].groupby(user_col).size().rename("pending_real_prizes")
+    received_before_counts = df[df["is_real_prize_received"]].groupby(user_col).size().rename("received_real_before_count")
+    table = pd.concat([pending_counts, received_before_counts], axis=1).fillna(0)
+    table["received_real_before_count"] = table["received_real_before_count"].astype(int)
+    table["has_received_real_before"] = table["received_real_before_count"] > 0
+    return table.reset_index()
+
+def time_of_day(work: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """События по часам суток и по парам (день недели, час) в поясе колонки win_date."""
+    hour = work["win_date"].dt.hour.rename("hour")
+    dow = work["win_date"].dt.dayofweek.rename("dow")  # 0=Mon ... 6=Sun
+    hour_df = hour.value_counts().sort_index().reset_index()
+    hour_df.columns = ["hour", "count"]
+    heat_df = pd.concat([dow, hour], axis=1).groupby(["dow", "hour"]).size().reset_index(name="count")
+    return hour_df, heat_df
+
+def _day_number(s: pd.Series) -> np.ndarray:
+    # Номер календарного дня (в локальном времени серии) от 1970-01-01
+    if getattr(s.dt, "tz", None) is not None:
+        s = s.dt.tz_localize(None)
+    return s.to_numpy().astype("datetime64[D]").astype("int64")
+
+def count_full_weeks(first_day: pd.Series, last_day: pd.Series) -> pd.Series:
+    """
+    Количество полных недель Пн–Вс внутри [first_day, last_day] (векторно).
+    Неделя полная, если её понедельник >= first_day и воскресенье <= last_day.
+    """
+    a = _day_number(first_day)
+    b = _day_number(last_day) - 6
+    monday = 4  # 1970-01-05 — понедельник
+    full = (b - monday) // 7 - (a - 1 - monday) // 7
+    full = np.where((b >= a) & first_day.notna().to_numpy() & last_day.notna().to_numpy(), full, 0)
+    return pd.Series(full.astype(int), index=first_day.index)
+
+@st.cache_data(show_spinner=False)
+def user_span_table(base: pd.DataFrame, user_col: str, own_last_scan: bool) -> pd.DataFrame:
+    """
+    Нормированные показатели активности по пользователю: span в днях/неделях,
+    сканы в день/неделю и количество полных недель.
+    own_last_scan=True — интервал до последнего собственного скана,
+    иначе до глобального конца периода.
+    """
+    total_scans_per_user = base.groupby(user_col).size().rename("total_scans")
+
+    global_last_day = base["win_date"].dt.floor("D").max()
+    global_last_week_start = base["win_date"].dt.to_period("W").max().start_time
+
+    per_user_first = base.groupby(user_col)["win_date"].min().to_frame(name="first_win")
+    per_user_first["first_day"] = per_user_first["first_win"].dt.floor("D")
+    per_user_first["first_week_start"] = per_user_first["first_win"].dt.to_period("W").dt.start_time
+
+    if own_last_scan:
+        per_user_last = base.groupby(user_col)["win_date"].max().to_frame(name="last_win")
+        per_user_span = per_user_first.join(per_user_last)
+        per_user_span["last_day"] = per_user_span["last_win"].dt.floor("D")
+        per_user_span["last_week_start"] = per_user_span["last_win"].dt.to_period("W").dt.start_time
+    else:
+        per_user_span = per_user_first.copy()
+        per_user_span["last_win"] = global_last_day
+        per_user_span["last_day"] = global_last_day
+        per_user_span["last_week_start"] = global_last_week_start
+
+    per_user_span["span_days"] = (per_user_span["last_day"] - per_user_span["first_day"]).dt.days + 1
+    per_user_span["span_weeks"] = ((per_user_span["last_week_start"] - per_user_span["first_week_start"]).dt.days // 7) + 1
+
+    per_user_span = per_user_span.join(total_scans_per_user)
+
+    per_user_span["span_days"] = per_user_span["span_days"].where(per_user_span["span_days"] > 0, 1)
+    per_user_span["span_weeks"] = per_user_span["span_weeks"].where(per_user_span["span_weeks"] > 0, 1)
+
+    per_user_span["daily_rate_span"] = per_user_span["total_scans"] / per_user_span["span_days"]
+    per_user_span["weekly_rate_span"] = per_user_span["total_scans"] / per_user_span["span_weeks"]
+
+    per_user_span["full_weeks"] = count_full_weeks(per_user_span["first_day"], per_user_span["last_day"])
+    per_user_span["weekly_rate_full_weeks"] = (
+        per_user_span["total_scans"] / per_user_span["full_weeks"].where(per_user_span["full_weeks"] > 0)
+    )
+    return per_user_span
@@ -17,8 +17,11 @@ def check_password():
     else:
         st.error("Неверный логин или пароль")
 
-def require_auth():
-    """Enforces authentication. Stops execution if not authenticated."""
+def require_auth(on_login_form=None):
+    """
+    Enforces authentication. Stops execution if not authenticated.
+    on_login_form() runs after the login form has been drawn (e.g. to start background work).
+    """
     if "authenticated" not in st.session_state:
         st.session_state["authenticated"] = False
 
@@ -27,4 +30,6 @@ def require_auth():
         st.text_input("Логин", key="username")
         st.text_input("Пароль", type="password", key="password")
         st.button("Войти", on_click=check_password)
+        if on_login_form is not None:
+            on_login_form()
         st.stop()
@@ -0,0 +1,177 @@
+import os
+import logging
+import importlib.util
+import streamlit as st
+import pandas as pd
+
+# Движок для тяжёлых группировок: "pandas" (по умолчанию) или "duckdb"
+# (многопоточный, колоночный; опциональная зависимость).
+# Выбор: переменная окружения MARTIN_APP_BACKEND или [analytics] backend в secrets.toml.
+# На DuckDB — корзины времени, когорты, RFM и сводка активности пользователей
+# (user_activity_table). Отбор строк и process_data остаются на pandas: данные уже
+# лежат в DataFrame, и перенос кадра в движок и обратно стоит дороже самих масок.
+# Результаты обоих движков сверяются: python -m bench.backends
+
+logger = logging.getLogger("martin_app.backend")
+
+BACKENDS = ["pandas", "duckdb"]
+_override = None
+
+def available_backends() -> list[str]:
+    return [b for b in BACKENDS if b == "pandas" or importlib.util.find_spec(b) is not None]
+
+def set_backend(name: str | None):
+    """Явный выбор движка в процессе (для сверки и бенчмарков); None — вернуть конфиг."""
+    global _override
+    if name is not None and name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    _override = name
+
+def _configured() -> str:
+    name = os.environ.get("MARTIN_APP_BACKEND")
+    if not name:
+        try:
+            name = st.secrets.get("analytics", {}).get("backend")
+        except Exception:
+            name = None
+    return name or "pandas"
+
+def get_backend() -> str:
+    name = _override or _configured()
+    if name not in available_backends():
+        logger.warning("backend %r is not available, using pandas", name)
+        return "pandas"
+    return name
+
+def _local_naive(s: pd.Series) -> pd.Series:
+    # Локальное «настенное» время без пояса: date_trunc в DuckDB режет по нему
+    if getattr(s.dt, "tz", None) is not None:
+        s = s.dt.tz_localize(None)
+    return s
+
+def _query(sql: str, **frames) -> pd.DataFrame:
+    import duckdb
+    con = duckdb.connect()
+    try:
+        for name, frame in frames.items():
+            con.register(name, frame)
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+_TRUNC = {"Day": "day", "Week": "week", "Month": "month"}
+
+def bucket_counts(ts: pd.Series, users: pd.Series | None, granularity: str) -> pd.Series:
+    """
+    DuckDB: события (или уникальные users) по началу дня/недели Пн/месяца.
+    ts — в нужном поясе; индекс результата — наивные локальные даты, как в aggregate_time.
+    """
+    frame = pd.DataFrame({"ts": _local_naive(ts).to_numpy()})
+    if users is not None:
+        frame["u"] = users.to_numpy()
+        agg = "count(DISTINCT u)"
+    else:
+        agg = "count(*)"
+    out = _query(
+        f"SELECT date_trunc('{_TRUNC[granularity]}', ts) AS date, {agg} AS count "
+        "FROM t WHERE ts IS NOT NULL GROUP BY 1 ORDER BY 1",
+        t=frame
+    )
+    return pd.Series(out["count"].to_numpy(), index=pd.DatetimeIndex(out["date"]).as_unit(frame["ts"].dt.unit))
+
+def cohort_counts(ts: pd.Series, users: pd.Series) -> pd.DataFrame:
+    """DuckDB: уникальные пользователи по (неделя первого скана, недель с первого скана)."""
+    frame = pd.DataFrame({"u": users.to_numpy(), "ts": _local_naive(ts).to_numpy()})
+    out = _query(
+        """
+        WITH d AS (SELECT u, ts FROM t WHERE ts IS NOT NULL),
+             f AS (SELECT u, date_trunc('week', min(ts)) AS cohort_week FROM d GROUP BY u)
+        SELECT f.cohort_week AS cohort_week,
+               CAST(date_diff('day', f.cohort_week, date_trunc('week', d.ts)) // 7 AS BIGINT) AS weeks_since_first,
+               count(DISTINCT d.u) AS users
+        FROM d JOIN f ON d.u = f.u
+        GROUP BY 1, 2 ORDER BY 1, 2
+        """,
+        t=frame
+    )
+    out["cohort_week"] = out["cohort_week"].astype(frame["ts"].dtype)
+    return out
+
+def per_user_rfm(df: pd.DataFrame, user_col: str) -> pd.DataFrame:
+    """DuckDB: последний скан, число сканов и real prizes по пользователю (строки с win_date)."""
+    df = df[df["win_date"].notna()]
+    ts = df["win_date"]
+    frame = pd.DataFrame({
+        "u": df[user_col].to_numpy(),
+        # время как целое число единиц от эпохи (UTC), чтобы тип и пояс вернулись без изменений
+        "ts": ts.dt.tz_convert("UTC").dt.tz_localize(None).astype("int64").to_numpy(),
+        "real": df["is_real_prize"].to_numpy(),
+    })
+    out = _query(
+        "SELECT u, max(ts) AS last_scan, count(*) AS frequency, count_if(real) AS real_prizes "
+        "FROM t WHERE u IS NOT NULL GROUP BY u ORDER BY u",
+        t=frame
+    )
+    out = out.rename(columns={"u": user_col})
+    out[user_col] = out[user_col].astype(df[user_col].dtype)
+    last = pd.to_datetime(out["last_scan"].astype("int64"), unit=ts.dt.unit, utc=True)
+    out["last_scan"] = last.dt.tz_convert(ts.dt.tz).astype(ts.dtype)
+    out["frequency"] = out["frequency"].astype("int64")
+    out["real_prizes"] = out["real_prizes"].astype("int64")
+    return out
+
+# Часы считаются теми же операциями, что и в pandas (total_seconds / 3600, среднее —
+# компенсированной суммой): иначе округление до 0.01 расходится на границе .005
+_PER_SECOND = {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}
+
+def per_user_activity(df: pd.DataFrame, user_col: str) -> pd.DataFrame:
+    """
+    DuckDB: сканы (строки с win_date), выигрыши, real prizes и среднее/медиана часов
+    между соседними сканами по пользователю; индекс — user_col, как у groupby в pandas.
+    У пользователей без сканов scans пустой, у пользователей с одним сканом — интервалы.
+    """
+    ts = df["win_date"]
+    frame = pd.DataFrame({
+        "u": df[user_col].to_numpy(),
+        "dated": ts.notna().to_numpy(),
+        # целое число единиц от эпохи (UTC); NaT отсекается по dated
+        "ts": ts.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().view("int64"),
+        "win": df["has_win"].to_numpy(),
+        "real": df["is_real_prize"].to_numpy(),
+    })
+    out = _query(
+        f"""
+        WITH d AS (
+            SELECT u, CAST(ts - lag(ts) OVER (PARTITION BY u ORDER BY ts) AS DOUBLE)
+                      / {_PER_SECOND[ts.dt.unit]} / 3600.0 AS delta_hours
+            FROM t WHERE u IS NOT NULL AND dated
+        ),
+        s AS (
+            SELECT u, count(*) AS scans,
+                   fsum(delta_hours) / count(delta_hours) AS avg_hours_between_scans,
+                   median(delta_hours) AS median_hours_between_scans
+            FROM d GROUP BY u
+        ),
+        w AS (
+            SELECT u, count_if(win) AS wins_any, count_if(real) AS real_prizes
+            FROM t WHERE u IS NOT NULL GROUP BY u
+        )
+        SELECT w.u, s.scans, w.wins_any, w.real_prizes,
+               s.avg_hours_between_scans, s.median_hours_between_scans
+        FROM w LEFT JOIN s ON w.u = s.u
+        """,
+        t=frame
+    )
+    out["u"] = out["u"].astype(df[user_col].dtype)
+    out = out.set_index("u").rename_axis(user_col).sort_index()
+    scanned = out["scans"].notna()
+    if scanned.all():
+        out["scans"] = out["scans"].astype("int64")
+    else:
+        # порядок как у pd.concat в pandas-ветке: пользователи без сканов — в конце;
+        # он решает порядок равных строк после итоговой сортировки
+        out = pd.concat([out[scanned], out[~scanned]])
+        out["scans"] = out["scans"].astype("float64")
+    out["wins_any"] = out["wins_any"].astype("int64")
+    out["real_prizes"] = out["real_prizes"].astype("int64")
+    return out
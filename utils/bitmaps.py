@@ -0,0 +1,68 @@
+"""
+Битовые индексы категориальных фильтров сайдбара над общим набором (shared_dataset).
+
+Для каждого значения измерения — битовая карта строк (np.packbits, 1 бит на строку).
+Выбор в multiselect: OR карт внутри измерения, AND между измерениями; затем
+строки берутся одним take из окна дат (win_date_slice) вместо isin + копии на каждый фильтр.
+"""
+import streamlit as st
+import numpy as np
+import pandas as pd
+
+# измерение фильтра -> колонка набора (prize_id фильтруется по целочисленному prize_code)
+DIMENSIONS = {
+    "region_name": "region_name",
+    "prize_id": "prize_code",
+    "win_type": "win_type",
+    "is_win_received": "is_win_received",
+    "user_segment": "user_segment",
+}
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+def _value_masks(s: pd.Series):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        for i, value in enumerate(s.cat.categories):
+            yield value, codes == i
+    else:
+        values = s.to_numpy()
+        for value in pd.unique(values):
+            yield value, values == value
+
+def build_bitmaps(df: pd.DataFrame) -> dict:
+    """Измерение -> {значение: упакованная битовая карта строк df}."""
+    bitmaps = {}
+    for dim, col in DIMENSIONS.items():
+        if col in df.columns:
+            bitmaps[dim] = {value: np.packbits(mask) for value, mask in _value_masks(df[col])}
+    return bitmaps
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def shared_bitmaps(version_key, user_col: str, _df: pd.DataFrame) -> dict:
+    """build_bitmaps для общего набора, один раз на версию и поле пользователя (сегменты)."""
+    return build_bitmaps(_df)
+
+def select(bitmaps: dict, selections: dict, n_rows: int) -> np.ndarray:
+    """selections: измерение -> выбранные значения. OR внутри измерения, AND между ними."""
+    empty = np.zeros((n_rows + 7) // 8, dtype=np.uint8)
+    result = None
+    for dim, values in selections.items():
+        maps = bitmaps.get(dim, {})
+        dim_bits = empty.copy()
+        for v in values:
+            if v in maps:
+                np.bitwise_or(dim_bits, maps[v], out=dim_bits)
+        result = dim_bits if result is None else np.bitwise_and(result, dim_bits, out=result)
+    return np.packbits(np.ones(n_rows, dtype=bool)) if result is None else result
+
+def cardinality(bits: np.ndarray) -> int:
+    """Число строк в выборке без распаковки карты."""
+    return int(_POPCOUNT[bits].sum())
+
+def positions(bits: np.ndarray, rows: slice) -> np.ndarray:
+    """Позиции строк выборки внутри rows (срез по позициям, как из win_date_slice)."""
+    lo, hi = rows.start or 0, rows.stop
+    first = lo // 8
+    mask = np.unpackbits(bits[first:(hi + 7) // 8])[lo - first * 8:hi - first * 8]
+    return np.flatnonzero(mask) + lo
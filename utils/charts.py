@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# Подготовка данных для Altair на стороне сервера: Vega-спека содержит только
+# агрегаты, а не сырые строки. Лимит строк на один график:
+CHART_ROW_BUDGET = 5000
+
+def histogram_bins(values: pd.Series, maxbins: int = 30) -> pd.DataFrame:
+    """Гистограмма в numpy: bin_start, bin_end, count (не больше maxbins корзин)."""
+    v = pd.to_numeric(values, errors="coerce").dropna().to_numpy(dtype=float)
+    if len(v) == 0:
+        return pd.DataFrame(columns=["bin_start", "bin_end", "count"])
+    counts, edges = np.histogram(v, bins=maxbins)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+def count_2d(df: pd.DataFrame, x: str, y: str, by: str | None = None, budget: int = CHART_ROW_BUDGET) -> pd.DataFrame:
+    """
+    Частоты точек (x, y[, by]) вместо одной точки на строку.
+    Если уникальных пар больше budget, x и y укрупняются в равные корзины
+    (координата корзины — её середина).
+    """
+    keys = [x, y] + ([by] if by else [])
+    data = df[keys]
+    out = data.groupby(keys, observed=True).size().reset_index(name="count")
+    bins = 64
+    while len(out) > budget and bins >= 2:
+        binned = data.copy()
+        for c in (x, y):
+            col = pd.to_numeric(binned[c], errors="coerce")
+            edges = np.linspace(col.min(), col.max(), bins + 1)
+            if edges[0] == edges[-1]:
+                continue
+            pos = np.clip(np.searchsorted(edges, col, side="right") - 1, 0, bins - 1)
+            binned[c] = (edges[pos] + edges[pos + 1]) / 2
+        out = binned.groupby(keys, observed=True).size().reset_index(name="count")
+        bins //= 2
+    return out
+
+def lttb(df: pd.DataFrame, x: str, y: str, budget: int = CHART_ROW_BUDGET) -> pd.DataFrame:
+    """
+    Прореживание ряда Largest-Triangle-Three-Buckets до budget точек.
+    Первая и последняя точки сохраняются; ряд должен быть отсортирован по x.
+    """
+    n = len(df)
+    if budget >= n or budget < 3:
+        return df
+    xs = pd.to_numeric(df[x]).to_numpy(dtype=float) if not pd.api.types.is_datetime64_any_dtype(df[x]) \
+        else df[x].array.asi8.astype(float)
+    ys = pd.to_numeric(df[y]).to_numpy(dtype=float)
+
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[nxt_lo:nxt_hi].mean()
+        avg_y = ys[nxt_lo:nxt_hi].mean()
+        area = np.abs(
+            (xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return df.iloc[keep]
+
+def cap_events(df: pd.DataFrame, date_col: str, category_col: str, budget: int = CHART_ROW_BUDGET) -> pd.DataFrame:
+    """
+    Лента событий: если строк больше budget, события сворачиваются в корзины
+    (час → день → неделя) по date_col × category_col с колонкой count.
+    Без свёртки count = 1 для каждой строки.
+    """
+    if len(df) <= budget:
+        return df.assign(count=1)
+    for freq in ["h", "D", "W"]:
+        if freq == "W":
+            s = df[date_col]
+            key = s.dt.tz_localize(None).dt.to_period("W").dt.start_time if getattr(s.dt, "tz", None) is not None \
+                else s.dt.to_period("W").dt.start_time
+        else:
+            key = df[date_col].dt.floor(freq)
+        out = df.assign(**{date_col: key}).groupby([date_col, category_col], observed=True).size().reset_index(name="count")
+        if len(out) <= budget:
+            break
+    return out.tail(budget)
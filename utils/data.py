@@ -1,11 +1,21 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+from utils.profiling import profiled
+
+WIN_TYPES = ["real_prize", "points", "no_win"]
+SEGMENT_LABELS = ["Active (2-5 scans)", "Novice (1 scan)", "Power User (6+ scans)"]
+REGION_MAP = {1: "Georgia", 2: "Armenia"}
+USER_ID_NAMES = ["customer_id", "user_id", "msisdn", "phone", "user_uuid", "uuid"]
+# Жёстко заданное начало периода анализа (UTC)
+START_FROM_STR = "2025-09-15"
 
 @st.cache_data(show_spinner=False)
 def load_data(source) -> pd.DataFrame:
     df = pd.read_csv(source)
     return df
 
+@profiled("process_data")
 def process_data(df: pd.DataFrame) -> pd.DataFrame:
     # Identify date columns
     DATE_COLS = [
@@ -32,14 +42,11 @@ def process_data(df: pd.DataFrame) -> pd.DataFrame:
         df["is_real_prize"] = False
         df["is_point_win"] = False
 
-    def _win_type(row):
-        if row["is_real_prize"]:
-            return "real_prize"
-        if row["is_point_win"]:
-            return "points"
-        return "no_win"
-
-    df["win_type"] = df.apply(_win_type, axis=1)
+    # Категориальные колонки: словари значений строятся один раз, фильтры сравнивают коды
+    df["win_type"] = pd.Categorical(
+        np.select([df["is_real_prize"], df["is_point_win"]], ["real_prize", "points"], default="no_win"),
+        categories=WIN_TYPES
+    )
 
     if "is_win_received" not in df.columns:
         df["is_win_received"] = False
@@ -52,14 +59,95 @@ def process_data(df: pd.DataFrame) -> pd.DataFrame:
     df["is_real_prize_received"] = df["is_real_prize"] & df["is_win_received"]
     df["is_real_prize_pending"] = df["is_real_prize"] & ~df["is_win_received"]
 
-    REGION_MAP = {1: "Georgia", 2: "Armenia"}
     if "region_id" in df.columns:
-        df["region_name"] = df["region_id"].map(REGION_MAP).fillna(df["region_id"].astype(str))
+        region_name = df["region_id"].map(REGION_MAP).fillna(df["region_id"].astype(str))
+        df["region_name"] = pd.Categorical(region_name, categories=sorted(region_name.dropna().unique()))
+    else:
+        df["region_name"] = pd.Categorical(["Unknown"] * len(df))
+
+    # Целочисленные коды prize_id (-1 = нет приза) для фильтра по призам
+    if "prize_id" in df.columns:
+        df["prize_code"] = pd.factorize(df["prize_id"], sort=True)[0].astype("int32")
     else:
-        df["region_name"] = "Unknown"
-        
+        df["prize_code"] = np.int32(-1)
+
+    # Базовая таблица упорядочена по win_date (NaT в конце): диапазоны дат — срезы (win_date_slice)
+    if "win_date" in df.columns:
+        df = df.sort_values("win_date", kind="stable", na_position="last")
+
     return df
 
+def _utc_key(ts, unit: str, ceil: bool) -> np.datetime64:
+    t = pd.Timestamp(ts)
+    t = (t.tz_convert("UTC") if t.tzinfo is not None else t.tz_localize("UTC")).tz_localize(None)
+    t = t.ceil(unit) if ceil else t.floor(unit)
+    return t.as_unit(unit).to_datetime64()
+
+def win_date_slice(df: pd.DataFrame, start=None, end=None) -> slice:
+    """
+    Позиции строк с start <= win_date <= end (без NaT) в кадре, упорядоченном по win_date,
+    как после process_data. Двоичный поиск: O(log N) вместо сравнения всей колонки.
+    """
+    s = df["win_date"]
+    values = s.values  # datetime64 в UTC, без копии
+    unit = np.datetime_data(values.dtype)[0]
+    lo = 0 if start is None else np.searchsorted(values, _utc_key(start, unit, ceil=True), side="left")
+    if end is None:
+        hi = np.searchsorted(values, np.datetime64("NaT", unit), side="left")
+    else:
+        hi = np.searchsorted(values, _utc_key(end, unit, ceil=False), side="right")
+    return slice(int(lo), int(max(lo, hi)))
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def shared_dataset(version_key, _loader) -> pd.DataFrame:
+    """
+    Обработанный набор (_loader() возвращает результат process_data) — один объект
+    на процесс для version_key, общий для всех сессий без копий. Только для чтения:
+    сессии строят производные кадры (маски, assign), при copy-on-write данные не копируются.
+    """
+    return _loader()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def shared_segments(version_key, user_col: str, _user_ids: pd.Series, _scan_counts=None) -> pd.Series:
+    """
+    user_segments для общего набора, один раз на версию и поле пользователя.
+    _scan_counts() — число сканов по пользователю во всём источнике, если набор загружен
+    не целиком (разделы utils.store); без него сканы считаются по _user_ids.
+    """
+    return user_segments(_user_ids, _scan_counts() if _scan_counts is not None else None)
+
 def get_user_col(df: pd.DataFrame):
     # user id column (customer_id приоритетно; fallback на user_id)
     return next((c for c in ["customer_id", "user_id"] if c in df.columns), None)
+
+def user_id_columns(columns) -> list:
+    """Колонки-кандидаты в идентификатор пользователя (выбор поля в сайдбаре)."""
+    return [c for c in columns if c in USER_ID_NAMES or c.lower().endswith("_id")]
+
+def user_segments(user_ids: pd.Series, scan_counts: pd.Series | None = None) -> pd.Series:
+    """
+    Сегмент пользователя по числу его сканов во всём наборе (категориальная колонка).
+    scan_counts — готовые счётчики id -> сканы (иначе value_counts по user_ids).
+    """
+    counts = user_ids.value_counts() if scan_counts is None else scan_counts
+    freq = user_ids.map(counts).fillna(0).to_numpy()
+    labels = np.select([freq == 1, freq <= 5], ["Novice (1 scan)", "Active (2-5 scans)"],
+                       default="Power User (6+ scans)")
+    return pd.Series(pd.Categorical(labels, categories=SEGMENT_LABELS), index=user_ids.index)
+
+@st.cache_data(show_spinner=False)
+def filter_dictionaries(dataset_key, _df: pd.DataFrame) -> dict:
+    """
+    Опции фильтров сайдбара, один раз на набор данных (dataset_key).
+    prizes: подпись prize_id -> целочисленный код из prize_code.
+    """
+    prizes = {}
+    if "prize_id" in _df.columns:
+        pairs = _df.loc[_df["prize_code"] >= 0, ["prize_code", "prize_id"]].drop_duplicates("prize_code")
+        prizes = {str(p): int(c) for c, p in zip(pairs["prize_code"], pairs["prize_id"])}
+        prizes = dict(sorted(prizes.items()))
+    return {
+        "regions": [str(r) for r in _df["region_name"].cat.categories],
+        "prizes": prizes,
+        "segments": list(SEGMENT_LABELS),
+    }
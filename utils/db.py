@@ -1,11 +1,15 @@
+from typing import TYPE_CHECKING
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
-from sshtunnel import SSHTunnelForwarder
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+# sqlalchemy и sshtunnel импортируются при первом подключении, а не при импорте модуля
 
 @st.cache_resource(show_spinner=False)
-def get_pg_engine() -> Engine:
+def get_pg_engine() -> "Engine":
+    from sqlalchemy import create_engine
     ssh = st.secrets.get("ssh", None)
     pg = st.secrets["pg"]
 
@@ -18,7 +22,7 @@ def get_pg_engine() -> Engine:
         # We need to be careful not to start multiple tunnels if the engine is cached.
         # Ideally, the tunnel should be attached to the engine or managed globally.
         # For now, we'll follow the original logic but wrap it.
-        
+        from sshtunnel import SSHTunnelForwarder
         forwarder = SSHTunnelForwarder(
             (ssh["host"], ssh.get("port", 22)),
             ssh_username=ssh["username"],
@@ -50,6 +54,7 @@ def load_from_db(sql: str) -> pd.DataFrame:
     return pd.read_sql_query(sql, eng)
 
 def check_db_connection():
+    from sqlalchemy import text
     try:
         with get_pg_engine().connect() as conn:
             pong = conn.execute(text("SELECT current_database() AS db, current_user AS usr, now() AS ts")).mappings().first()
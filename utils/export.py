@@ -0,0 +1,106 @@
+import io
+import gzip
+import hashlib
+import importlib.util
+import streamlit as st
+import pandas as pd
+
+# Выгрузки сериализуются только по запросу (кнопка «Подготовить»), по частям,
+# и кэшируются по ключу содержимого таблицы (ключ узла мемо-графа от вызывающего
+# или отпечаток содержимого).
+
+CSV_CHUNK_ROWS = 100_000
+XLSX_MAX_ROWS = 1_048_575
+
+EXPORT_FORMATS = {
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def available_formats() -> list[str]:
+    """Форматы, для которых установлены зависимости (pyarrow, openpyxl)."""
+    needs = {"Parquet": "pyarrow", "XLSX": "openpyxl"}
+    return [f for f in EXPORT_FORMATS if f not in needs or importlib.util.find_spec(needs[f]) is not None]
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Отпечаток содержимого таблицы (колонки, типы, значения)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode("utf-8"))
+    h.update(str(len(df)).encode("utf-8"))
+    if len(df):
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _write_csv_chunks(df: pd.DataFrame, buf):
+    for start in range(0, max(len(df), 1), CSV_CHUNK_ROWS):
+        chunk = df.iloc[start:start + CSV_CHUNK_ROWS]
+        buf.write(chunk.to_csv(index=False, header=(start == 0)).encode("utf-8"))
+
+def serialize_frame(df: pd.DataFrame, fmt: str) -> bytes:
+    """Сериализует таблицу в один из EXPORT_FORMATS."""
+    out = io.BytesIO()
+    if fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+            _write_csv_chunks(df, gz)
+    elif fmt == "CSV":
+        _write_csv_chunks(df, out)
+    elif fmt == "Parquet":
+        df.to_parquet(out, index=False, compression="zstd")
+    elif fmt == "XLSX":
+        if len(df) > XLSX_MAX_ROWS:
+            raise ValueError(f"XLSX вмещает не более {XLSX_MAX_ROWS} строк, в таблице {len(df)}.")
+        # Excel не хранит часовые пояса
+        plain = df.copy()
+        for c in plain.columns:
+            if isinstance(plain[c].dtype, pd.DatetimeTZDtype):
+                plain[c] = plain[c].dt.tz_localize(None)
+        plain.to_excel(out, index=False, engine="openpyxl")
+    else:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    return out.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _serialize_cached(content_key, fmt: str, _df: pd.DataFrame) -> bytes:
+    # _df не хешируется Streamlit: ключ кэша — ключ содержимого и формат
+    return serialize_frame(_df, fmt)
+
+@st.fragment
+def export_download(label: str, df: pd.DataFrame, file_stem: str, data_key=None):
+    """
+    Выгрузка таблицы: формат выбирается, файл собирается только после нажатия
+    «Подготовить», клики перезапускают только этот фрагмент.
+    data_key — ключ содержимого df (узел мемо-графа, версия предрасчёта); None — отпечаток df.
+    """
+    formats = available_formats()
+    col_fmt, col_btn = st.columns([1, 2])
+    fmt = col_fmt.selectbox("Формат", formats, key=f"export_{file_stem}_fmt", label_visibility="collapsed")
+    ready_key = f"export_{file_stem}_ready"
+    # без data_key таблица хешируется целиком на каждом прогоне (id(df) не годится:
+    # пересобранный кадр может получить адрес старого)
+    content_key = data_key if data_key is not None else frame_fingerprint(df)
+
+    if col_btn.button(f"Подготовить: {label}", key=f"export_{file_stem}_prepare"):
+        st.session_state[ready_key] = (fmt, content_key)
+
+    # Готовый файл показываем, пока фрагмент перезапускается с той же таблицей и форматом
+    ready = st.session_state.get(ready_key)
+    if not ready or ready[0] != fmt or ready[1] != content_key:
+        return
+
+    with st.spinner("Готовим файл…"):
+        try:
+            data = _serialize_cached(ready[1], fmt, df)
+        except ValueError as e:
+            st.error(str(e))
+            return
+    ext, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        f"Скачать {label}",
+        data,
+        file_name=f"{file_stem}{ext}",
+        mime=mime,
+        key=f"export_{file_stem}_download"
+    )
+    st.caption(f"{len(df)} строк, {len(data) / 1024:.1f} KB")
@@ -0,0 +1,512 @@
+import math
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+# ------------------------------- Model ----------------------------------------
+@dataclass
+class StageSpec:
+    name: str
+    hunger_cap: int
+    size_cap: int
+    daily_hunger_loss: int
+    stageup_bonus_pts: int = 0  # optional: add to wallet on stage-up
+
+DEFAULT_STAGES = {
+    "small":  StageSpec("small",  hunger_cap=5,  size_cap=5,  daily_hunger_loss=1, stageup_bonus_pts=5),
+    "medium": StageSpec("medium", hunger_cap=10, size_cap=15, daily_hunger_loss=1, stageup_bonus_pts=10),
+    "adult":  StageSpec("adult",  hunger_cap=20, size_cap=15, daily_hunger_loss=2, stageup_bonus_pts=0),
+}
+
+STAGE_ORDER = ["small", "medium", "adult"]
+STAGE_FIELDS = ["hunger_cap", "size_cap", "daily_hunger_loss", "stageup_bonus_pts"]
+
+def next_stage_name(cur: str) -> str | None:
+    i = STAGE_ORDER.index(cur)
+    return STAGE_ORDER[i+1] if i+1 < len(STAGE_ORDER) else None
+
+# Cost rule: 1st feed free, then 1,2,3,...
+def feed_cost_for(feed_index_1_based: int) -> int:
+    return max(0, feed_index_1_based - 1)
+
+# Кормёжка k (с нуля) стоит k: за кормёжки first..k-1 уплачено T(k-1) - T(first-1), T(x) = x(x+1)/2.
+# Вычитание целых из кошелька точно (|wallet| < 2**53), так что одна разность равна
+# последовательным wallet -= 1, 2, ... жадного цикла, и проверка ниже совпадает побитово.
+def can_pay(wallet: float, first: int, k: int) -> bool:
+    """Кормёжка k по карману, если перед кормёжкой first в кошельке wallet."""
+    return k < 1 or wallet - (k * (k - 1) // 2 - first * (first - 1) // 2) + 1e-9 >= k
+
+def last_affordable(wallet: float, first: int) -> int:
+    """Номер последней кормёжки подряд от first, на которую хватает кошелька (first - 1 — ни одной)."""
+    # wallet + T(first-1) >= T(k): оценка через корень, затем уточнение точной проверкой (±1)
+    x = max(0.0, wallet + first * (first - 1) // 2)
+    k = max(first - 1, int((math.sqrt(8 * x + 1) - 1) / 2))
+    while can_pay(wallet, first, k + 1):
+        k += 1
+    while k >= first and not can_pay(wallet, first, k):
+        k -= 1
+    return k
+
+# ------------------------------ Simulator -------------------------------------
+# fast_forward=True: повторяющиеся отрезки (тот же этап/голод/размер в начале периода,
+# без роста за период) не проигрываются по дням — прыжок сразу до ближайшего события:
+# первого дня, где кошелёк меняет число кормлений (порог), конца горизонта или, без визитов,
+# дня смерти. Период — 1 день, либо неделя при недельном начислении и в режиме кормлений.
+# Кошелёк за прыжок считается np.add.accumulate в том же порядке операций, что и по дням,
+# поэтому summary совпадает побитово; лог — по отрезкам (day_from..day_to) вместо дней.
+RUN_COLUMNS = ["day_from", "day_to", "days", "stage", "hunger", "size", "feeds", "paid_spent",
+               "wallet_end", "size_gains", "stage_up"]
+
+def simulate_goose(
+    weekly_pts: float,
+    stages: dict[str, StageSpec],
+    accrual_mode: str = "daily",  # "daily" or "weekly"
+    weekly_value_mode: str = "points",  # "points" or "feeds"
+    start_stage: str = "small",
+    start_hunger: int = 3,
+    start_size: int = 1,
+    visit_daily: bool = True,
+    max_paid_feeds_per_day: int = 10,
+    add_stageup_bonus_to_wallet: bool = True,
+    max_days: int = 365,
+    fast_forward: bool = False
+) -> tuple[pd.DataFrame, dict]:
+    cur_stage = start_stage
+    hunger = start_hunger
+    size = start_size
+    wallet = 0.0
+    total_paid = 0.0
+    last_day = 0
+
+    log = []
+    day_reached_medium = None
+    day_reached_adult = None
+    died_on_day = None
+
+    def spec() -> StageSpec:
+        return stages[cur_stage]
+
+    daily_income = weekly_pts / 7.0
+
+    # Weekly feeding plan (only used when weekly_value_mode == "feeds")
+    weekly_feed_plan: list[int] | None = None
+    if weekly_value_mode == "feeds":
+        total_feeds = max(0, int(round(weekly_pts)))
+        baseline = 1 if visit_daily else 0
+        # start with baseline per day
+        plan = [baseline for _ in range(7)]
+        extras = max(0, total_feeds - baseline * 7)
+        # fill extras from Monday forward, respecting daily cap = 1 + max_paid_feeds_per_day
+        i = 0
+        while extras > 0 and i < 7:
+            cap_today = baseline + max(0, int(max_paid_feeds_per_day)) + 0  # total feeds allowed today
+            can_add = max(0, cap_today - plan[i])
+            add_now = min(extras, can_add)
+            plan[i] += add_now
+            extras -= add_now
+            i += 1
+        weekly_feed_plan = plan
+
+    def feeds_cap(day: int) -> int:
+        if weekly_value_mode == "feeds" and weekly_feed_plan is not None:
+            return weekly_feed_plan[(day - 1) % 7]
+        return 1 + max(0, int(max_paid_feeds_per_day))
+
+    def accruals(first_day: int, n_days: int) -> np.ndarray:
+        # Начисления в кошелёк по дням first_day.. (0 — нет начисления)
+        if weekly_value_mode != "points":
+            return np.zeros(n_days)
+        if accrual_mode == "daily":
+            return np.full(n_days, daily_income)
+        monday = (np.arange(first_day, first_day + n_days) - 1) % 7 == 0
+        return np.where(monday, weekly_pts, 0.0)
+
+    def play_day(day: int) -> dict:
+        nonlocal cur_stage, hunger, size, wallet, day_reached_medium, day_reached_adult, died_on_day
+        # Начисление очков (только для режима валюты)
+        if weekly_value_mode == "points":
+            if accrual_mode == "daily":
+                wallet += daily_income
+            else:
+                if day == 1 or ((day - 1) % 7 == 0):
+                    wallet += weekly_pts
+
+        # Суточное снижение голода до визита
+        hunger -= spec().daily_hunger_loss
+        if hunger <= 0:
+            hunger = 0
+            died_on_day = day
+            return {
+                "day": day, "stage": cur_stage, "hunger": hunger, "size": size,
+                "feeds_today": 0, "paid_spent": 0.0, "wallet_end": wallet,
+                "size_gains": 0, "stage_up": ""
+            }
+
+        feeds_today = 0
+        paid_spent = 0.0
+        size_gains = 0
+        stage_up_label = ""
+
+        if visit_daily:
+            max_feeds_today = feeds_cap(day)
+
+            # Жадная стратегия (кормим, пока по карману и не упёрлись в лимит) в закрытой форме:
+            # день делится stage-up на не более чем 3 отрезка; внутри отрезка первые
+            # hunger_cap - hunger кормлений добирают голод, остальные растят size до size_cap.
+            while feeds_today < max_feeds_today:
+                last = max_feeds_today - 1
+                if weekly_value_mode == "points":
+                    # в режиме "feeds" кошелёк не ограничивает, затраты гипотетические
+                    last = min(last, last_affordable(wallet, feeds_today))
+                n = last - feeds_today + 1
+                if n <= 0:
+                    break
+
+                headroom = max(0, spec().hunger_cap - hunger)
+                grow_room = max(0, spec().size_cap - size)
+                gains = min(max(0, n - headroom), grow_room)
+                nxt = next_stage_name(cur_stage)
+                stage_up = gains > 0 and gains == grow_room and nxt is not None
+                if stage_up:
+                    n = headroom + grow_room  # отрезок кончается кормёжкой со stage-up
+
+                cost = (2 * feeds_today + n - 1) * n // 2  # кормёжки feeds_today..feeds_today+n-1
+                if weekly_value_mode == "points":
+                    wallet -= cost
+                paid_spent += cost
+                size += gains
+                size_gains += gains
+                if stage_up:
+                    # перед кормёжкой со stage-up голод полный (или выше cap, если она первая в отрезке)
+                    hunger_before = hunger if n == 1 else spec().hunger_cap
+                    prev_stage = cur_stage
+                    cur_stage = nxt
+                    stage_up_label = f"{prev_stage}->{cur_stage}"
+
+                    # Начисляем бонус за переход (берём у прошлого этапа)
+                    if add_stageup_bonus_to_wallet:
+                        wallet += stages[prev_stage].stageup_bonus_pts
+
+                    # Отметка дней достижения этапов
+                    if prev_stage == "small" and day_reached_medium is None:
+                        day_reached_medium = day
+                    if prev_stage == "medium" and day_reached_adult is None:
+                        day_reached_adult = day
+                    hunger = min(hunger_before + 1, spec().hunger_cap)
+                else:
+                    hunger = min(hunger + n, spec().hunger_cap)
+                feeds_today += n
+
+        return {
+            "day": day, "stage": cur_stage, "hunger": hunger, "size": size,
+            "feeds_today": feeds_today, "paid_spent": paid_spent,
+            "wallet_end": wallet, "size_gains": size_gains,
+            "stage_up": stage_up_label
+        }
+
+    period = 7 if weekly_value_mode == "feeds" or (weekly_value_mode == "points" and accrual_mode == "weekly") else 1
+    played = []  # (состояние в начале дня, строка дня) — дни, проигранные подряд после последнего прыжка
+
+    def repeat_cycles(day: int) -> tuple[int, float] | None:
+        """(целых периодов с day, повторяющих последний проигранный период; кошелёк после них)."""
+        if len(played) < period or played[-period][1]["day"] != day - period:
+            return None
+        if played[-period][0] != (cur_stage, hunger, size):
+            return None
+        last = [row for _, row in played[-period:]]
+        if any(row["size_gains"] for row in last):
+            return None
+        cycles = (max_days - day + 1) // period
+        if weekly_value_mode != "points":
+            return cycles, wallet  # кошелёк не ограничивает и не меняется: период повторяется до горизонта
+
+        acc = accruals(day, period)
+        n = np.array([row["feeds_today"] for row in last], dtype=np.int64)
+        cap = np.array([feeds_cap(row["day"]) for row in last], dtype=np.int64)
+        cost = n * (n - 1) // 2
+        plan = list(zip(acc.tolist(), n.tolist(), cap.tolist(), cost.tolist()))
+
+        # первые периоды — по одному (события часто близко), дальше — блоками в numpy
+        done, w = 0, wallet
+        while done < min(cycles, 16):
+            nxt = w
+            for a, k, c, spent in plan:
+                nxt += a
+                if not (can_pay(nxt, 0, k - 1) and (k == c or not can_pay(nxt, 0, k))):
+                    return done, w
+                nxt -= spent
+            w = nxt
+            done += 1
+        chunk = 32
+        while done < cycles:
+            m = min(chunk, cycles - done)
+            ops = np.empty(2 * period * m + 1)
+            ops[0] = w
+            ops[1::2] = np.tile(acc, m)
+            ops[2::2] = -np.tile(cost, m)
+            trail = np.add.accumulate(ops)  # последовательно, как wallet += / -= по дням
+            before = trail[1::2]  # кошелёк после начисления, до кормлений
+            nn, cc = np.tile(n, m), np.tile(cap, m)
+            all_fed = (nn < 2) | (before - (nn - 1) * (nn - 2) // 2 + 1e-9 >= nn - 1)
+            stopped = (nn == cc) | (before - nn * (nn - 1) // 2 + 1e-9 < nn)
+            changed = np.flatnonzero(~(all_fed & stopped))
+            if changed.size:
+                whole = int(changed[0]) // period
+                return done + whole, float(trail[2 * period * whole])
+            done += m
+            w = float(trail[-1])
+            chunk *= 2
+        return done, w
+
+    def jump(day: int) -> dict | None:
+        """Строка лога за прыжок с day или None, если повтора нет."""
+        nonlocal hunger, wallet, total_paid
+        if cur_stage == "adult":
+            return None
+        if not visit_daily:
+            # без визитов голод убывает линейно: день смерти известен заранее
+            loss = spec().daily_hunger_loss
+            if hunger - loss <= 0:
+                return None  # гибнет сегодня (в том числе с голодом 0 при нулевой потере) — день по обычному пути
+            days = max_days - day + 1
+            if loss > 0:
+                days = min(days, (hunger - 1) // loss)
+            if days < 2:
+                return None
+            ops = np.concatenate(([wallet], accruals(day, days)))
+            wallet = float(np.add.accumulate(ops)[-1])
+            hunger -= days * loss
+            feeds = paid = 0
+        else:
+            if (day - 1) % period != 0:
+                return None
+            found = repeat_cycles(day)
+            if found is None or found[0] == 0:
+                return None
+            cycles, wallet = found
+            last = [row for _, row in played[-period:]]
+            days = cycles * period
+            feeds = cycles * sum(row["feeds_today"] for row in last)
+            paid = cycles * sum(row["paid_spent"] for row in last)
+        total_paid += paid
+        played.clear()
+        return {
+            "day_from": day, "day_to": day + days - 1, "days": days, "stage": cur_stage,
+            "hunger": hunger, "size": size, "feeds": feeds, "paid_spent": float(paid),
+            "wallet_end": wallet, "size_gains": 0, "stage_up": ""
+        }
+
+    day = 1
+    while day <= max_days:
+        if fast_forward:
+            run = jump(day)
+            if run is not None:
+                log.append(run)
+                last_day = run["day_to"]
+                day = last_day + 1
+                continue
+            played.append(((cur_stage, hunger, size), None))
+        row = play_day(day)
+        last_day = day
+        total_paid += row["paid_spent"]
+        if fast_forward:
+            played[-1] = (played[-1][0], row)
+            log.append(_run_row(row))
+        else:
+            log.append(row)
+        if died_on_day is not None:
+            break
+
+        # Можно завершать симуляцию, как только достигли adult (метрика времени до adult)
+        if cur_stage == "adult":
+            if day_reached_adult is None:
+                day_reached_adult = day
+            break
+        day += 1
+
+    df = pd.DataFrame(log, columns=RUN_COLUMNS) if fast_forward else pd.DataFrame(log)
+    summary = {
+        "days_run": last_day,
+        "reached_medium_on_day": day_reached_medium,
+        "reached_adult_on_day": day_reached_adult,
+        "died_on_day": died_on_day,
+        "final_stage": cur_stage,
+        "final_hunger": int(hunger),
+        "final_size": int(size),
+        "wallet_end": float(wallet),
+        "total_paid_spent": float(total_paid)
+    }
+    return df, summary
+
+def _run_row(row: dict) -> dict:
+    # Дневная строка simulate_goose в формате лога по отрезкам
+    return {
+        "day_from": row["day"], "day_to": row["day"], "days": 1, "stage": row["stage"],
+        "hunger": row["hunger"], "size": row["size"], "feeds": row["feeds_today"],
+        "paid_spent": row["paid_spent"], "wallet_end": row["wallet_end"],
+        "size_gains": row["size_gains"], "stage_up": row["stage_up"]
+    }
+
+# --------------------------- Batch simulator ----------------------------------
+# Тысячи сценариев за один проход: состояние (hunger, size, stage, wallet, день) —
+# массивы numpy по сценариям, цикл только по дням и отрезкам дня между stage-up.
+# Итоги совпадают с simulate_goose поле в поле (сверка: python -m bench.goose).
+
+def scenario_grid(stages: dict[str, StageSpec], weekly_pts=(2.0,), max_paid_feeds_per_day=(10,), **stage_axes) -> pd.DataFrame:
+    """
+    Декартово произведение осей, одна строка — один сценарий.
+    Оси этапов называются "<этап>_<поле>", например small_size_cap=[3, 5, 7];
+    не заданные оси берутся из stages.
+    """
+    axes = {"weekly_pts": list(weekly_pts), "max_paid_feeds_per_day": list(max_paid_feeds_per_day)}
+    for stage in STAGE_ORDER:
+        for f in STAGE_FIELDS:
+            col = f"{stage}_{f}"
+            axes[col] = list(stage_axes.pop(col, [getattr(stages[stage], f)]))
+    if stage_axes:
+        raise ValueError(f"Unknown grid axes: {sorted(stage_axes)}")
+    return pd.MultiIndex.from_product(list(axes.values()), names=list(axes)).to_frame(index=False)
+
+def scenario_stages(row) -> dict[str, StageSpec]:
+    """StageSpec этапов из строки scenario_grid."""
+    return {
+        stage: StageSpec(stage, **{f: int(row[f"{stage}_{f}"]) for f in STAGE_FIELDS})
+        for stage in STAGE_ORDER
+    }
+
+def _weekly_feed_plan(weekly_pts: np.ndarray, paid_cap: np.ndarray, visit_daily: bool) -> np.ndarray:
+    # Как в simulate_goose: базовая кормёжка в день + добор с понедельника в пределах лимита
+    total = np.maximum(0, np.round(weekly_pts).astype(np.int64))
+    baseline = 1 if visit_daily else 0
+    extras = np.maximum(0, total - baseline * 7)
+    days = np.arange(7)
+    return baseline + np.clip(extras[:, None] - days[None, :] * paid_cap[:, None], 0, paid_cap[:, None])
+
+def _last_affordable_batch(wallet: np.ndarray, first: np.ndarray) -> np.ndarray:
+    # last_affordable по сценариям
+    def can_pay(k):
+        return (k < 1) | (wallet - (k * (k - 1) // 2 - first * (first - 1) // 2) + 1e-9 >= k)
+
+    x = np.maximum(0.0, wallet + first * (first - 1) // 2)
+    k = np.maximum(first - 1, ((np.sqrt(8 * x + 1) - 1) / 2).astype(np.int64))
+    while True:
+        more = can_pay(k + 1)
+        if not more.any():
+            break
+        k += more
+    while True:
+        less = (k >= first) & ~can_pay(k)
+        if not less.any():
+            break
+        k -= less
+    return k
+
+def simulate_goose_batch(
+    scenarios: pd.DataFrame,
+    accrual_mode: str = "daily",
+    weekly_value_mode: str = "points",
+    start_stage: str = "small",
+    start_hunger: int = 3,
+    start_size: int = 1,
+    visit_daily: bool = True,
+    add_stageup_bonus_to_wallet: bool = True,
+    max_days: int = 365
+) -> pd.DataFrame:
+    """
+    simulate_goose для каждой строки scenarios (колонки scenario_grid); возвращает
+    поля summary по сценариям (индекс — как у scenarios, дни без события — <NA>).
+    """
+    n = len(scenarios)
+    rows = np.arange(n)
+    param = {f: np.stack([scenarios[f"{stage}_{f}"].to_numpy(np.int64) for stage in STAGE_ORDER], axis=1)
+             for f in STAGE_FIELDS}
+    hunger_cap, size_cap = param["hunger_cap"], param["size_cap"]
+    loss, bonus = param["daily_hunger_loss"], param["stageup_bonus_pts"]
+    weekly_pts = scenarios["weekly_pts"].to_numpy(np.float64)
+    paid_cap = np.maximum(0, scenarios["max_paid_feeds_per_day"].to_numpy(np.float64).astype(np.int64))
+    daily_income = weekly_pts / 7.0
+    feed_plan = _weekly_feed_plan(weekly_pts, paid_cap, visit_daily) if weekly_value_mode == "feeds" else None
+    last_stage = len(STAGE_ORDER) - 1
+
+    stage = np.full(n, STAGE_ORDER.index(start_stage), dtype=np.int64)
+    hunger = np.full(n, start_hunger, dtype=np.int64)
+    size = np.full(n, start_size, dtype=np.int64)
+    wallet = np.zeros(n)
+    spent = np.zeros(n, dtype=np.int64)
+    days_run = np.zeros(n, dtype=np.int64)
+    day_medium = np.full(n, -1, dtype=np.int64)
+    day_adult = np.full(n, -1, dtype=np.int64)
+    died = np.full(n, -1, dtype=np.int64)
+    done = np.zeros(n, dtype=bool)
+
+    for day in range(1, max_days + 1):
+        act = ~done
+        if not act.any():
+            break
+        if weekly_value_mode == "points":
+            if accrual_mode == "daily":
+                wallet[act] += daily_income[act]
+            elif day == 1 or (day - 1) % 7 == 0:
+                wallet[act] += weekly_pts[act]
+
+        hunger[act] -= loss[rows, stage][act]
+        dead = act & (hunger <= 0)
+        hunger[dead] = 0
+        died[dead] = day
+        days_run[dead] = day
+        done |= dead
+        act &= ~dead
+
+        if visit_daily:
+            # Кормления дня отрезками между stage-up (как в simulate_goose): не больше 3 проходов
+            max_feeds = feed_plan[:, (day - 1) % 7] if feed_plan is not None else 1 + paid_cap
+            fed = np.zeros(n, dtype=np.int64)
+            feeding = act.copy()
+            while feeding.any():
+                last = max_feeds - 1
+                if weekly_value_mode == "points":
+                    last = np.minimum(last, _last_affordable_batch(wallet, fed))
+                cnt = np.where(feeding, np.maximum(0, last - fed + 1), 0)
+                feeding &= cnt > 0
+
+                hcap, scap = hunger_cap[rows, stage], size_cap[rows, stage]
+                headroom = np.maximum(0, hcap - hunger)
+                grow_room = np.maximum(0, scap - size)
+                gains = np.where(feeding, np.minimum(np.maximum(0, cnt - headroom), grow_room), 0)
+                up = feeding & (gains > 0) & (gains == grow_room) & (stage < last_stage)
+                cnt = np.where(up, headroom + grow_room, cnt)
+
+                cost = (2 * fed + cnt - 1) * cnt // 2
+                if weekly_value_mode == "points":
+                    wallet[feeding] -= cost[feeding]
+                spent += cost
+                size += gains
+                hunger_before = np.where(cnt == 1, hunger, hcap)
+                hunger = np.where(feeding, np.minimum(hunger + cnt, hcap), hunger)
+                if add_stageup_bonus_to_wallet:
+                    wallet[up] += bonus[rows, stage][up]
+                day_medium[up & (stage == 0) & (day_medium < 0)] = day
+                day_adult[up & (stage == 1) & (day_adult < 0)] = day
+                stage[up] += 1
+                hunger = np.where(up, np.minimum(hunger_before + 1, hunger_cap[rows, stage]), hunger)
+                fed += cnt
+                feeding = up  # день продолжается только после stage-up
+
+        days_run[act] = day
+        adult = act & (stage == last_stage)
+        day_adult[adult & (day_adult < 0)] = day
+        done |= adult
+
+    out = pd.DataFrame({
+        "days_run": days_run,
+        "reached_medium_on_day": pd.Series(day_medium, dtype="Int64").where(day_medium > 0),
+        "reached_adult_on_day": pd.Series(day_adult, dtype="Int64").where(day_adult > 0),
+        "died_on_day": pd.Series(died, dtype="Int64").where(died > 0),
+        "final_stage": np.array(STAGE_ORDER, dtype=object)[stage],
+        "final_hunger": hunger,
+        "final_size": size,
+        "wallet_end": wallet,
+        "total_paid_spent": spent.astype(np.float64),
+    })
+    out.index = scenarios.index
+    return out
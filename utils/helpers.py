@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 import datetime as dt
+from utils.profiling import profiled
+from utils import backend
 
 def build_time_index(series, granularity: str):
     if granularity == "Day":
@@ -26,6 +29,7 @@ def _to_naive_utc_ts(ts) -> dt.datetime:
         t = t.tz_convert("UTC").tz_localize(None)
     return t.to_pydatetime()
 
+@profiled("aggregate_time")
 def aggregate_time(df_in: pd.DataFrame, date_field: str, granularity: str, unique_mode: bool, local_tz: str, user_col: str):
     """
     Агрегация по win_date без смещения дней.
@@ -37,20 +41,25 @@ def aggregate_time(df_in: pd.DataFrame, date_field: str, granularity: str, uniqu
     if local_tz != "UTC":
         s = s.dt.tz_convert(local_tz)
 
-    if granularity == "Day":
-        key = s.dt.floor("D")
-        freq = "D"
-    elif granularity == "Week":
-        key = s.dt.to_period("W").dt.start_time
-        freq = "W-MON"
+    if backend.get_backend() == "duckdb":
+        users = df_in[user_col] if (unique_mode and user_col) else None
+        grouped = backend.bucket_counts(s, users, granularity)
+        freq = {"Day": "D", "Week": "W-MON"}.get(granularity, "MS")
     else:
-        key = s.dt.to_period("M").dt.to_timestamp()
-        freq = "MS"
+        if granularity == "Day":
+            key = s.dt.floor("D")
+            freq = "D"
+        elif granularity == "Week":
+            key = s.dt.to_period("W").dt.start_time
+            freq = "W-MON"
+        else:
+            key = s.dt.to_period("M").dt.to_timestamp()
+            freq = "MS"
 
-    if unique_mode and user_col:
-        grouped = df_in.assign(_g=key).groupby("_g")[user_col].nunique()
-    else:
-        grouped = pd.Series(1, index=key).groupby(level=0).size()
+        if unique_mode and user_col:
+            grouped = df_in.assign(_g=key).groupby("_g")[user_col].nunique()
+        else:
+            grouped = pd.Series(1, index=key).groupby(level=0).size()
 
     out = grouped.sort_index().reset_index()
     out.columns = ["date", "count"]
@@ -76,6 +85,23 @@ def aggregate_time(df_in: pd.DataFrame, date_field: str, granularity: str, uniqu
 def safe_rate(num, den):
     return (num / den) if den else 0
 
+def wilson_interval(successes, totals, z: float = 1.96):
+    """
+    Доверительный интервал Уилсона для доли successes/totals (векторно).
+    При totals == 0 возвращает (0, 0).
+    """
+    k = np.asarray(successes, dtype=float)
+    n = np.asarray(totals, dtype=float)
+    safe_n = np.where(n > 0, n, 1.0)
+    p = k / safe_n
+    z2 = z * z
+    denom = 1 + z2 / safe_n
+    center = (p + z2 / (2 * safe_n)) / denom
+    half = z * np.sqrt(p * (1 - p) / safe_n + z2 / (4 * safe_n * safe_n)) / denom
+    low = np.where(n > 0, np.clip(center - half, 0, 1), 0.0)
+    high = np.where(n > 0, np.clip(center + half, 0, 1), 0.0)
+    return low, high
+
 def span_stats(series: pd.Series):
     s = pd.to_numeric(series.dropna(), errors="coerce")
     s = s[~pd.isna(s)]
@@ -0,0 +1,114 @@
+"""
+Мемо-граф конвейера страницы: фильтры -> окно дат (work) -> область метрик -> разделы.
+
+Узел кэшируется по ключу из входов, от которых он зависит, а не по содержимому кадров:
+    ("window", version_key, поле пользователя, фильтры, пояс, строки) -> кадр окна
+    (раздел, ключ входного кадра, параметры раздела)                  -> результат раздела
+Смена одного контрола меняет ключи только зависимых узлов: gran пересчитывает лишь
+временные ряды, область метрик — лишь разделы по metrics_df.
+
+Один LRU на процесс (общий для сессий: ключи включают версию набора),
+вытеснение по оценке занимаемых байт. Результаты узлов только для чтения.
+"""
+import os
+import threading
+from collections import OrderedDict
+import streamlit as st
+import numpy as np
+import pandas as pd
+from utils.parallel import run_sections
+
+MEMO_MB = 256
+
+def memo_budget() -> int:
+    """Бюджет в байтах: MARTIN_APP_MEMO_MB или MEMO_MB."""
+    return int(os.environ.get("MARTIN_APP_MEMO_MB", MEMO_MB)) * 2**20
+
+def nbytes(obj) -> int:
+    """Оценка памяти результата (без deep: строки object считаются по указателям)."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=False))
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return 64 + sum(nbytes(v) for v in obj.values())
+    if isinstance(obj, (tuple, list)):
+        return 64 + sum(nbytes(v) for v in obj)
+    return 64
+
+class MemoGraph:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # ключ -> (значение, байты)
+        self._lock = threading.Lock()
+
+    def lookup(self, key) -> tuple[bool, object]:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True, self._items[key][0]
+            self.misses += 1
+            return False, None
+
+    def store(self, key, value):
+        size = nbytes(value)
+        if size > self.budget:
+            return value
+        with self._lock:
+            if key in self._items:
+                self.used -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.used += size
+            while self.used > self.budget:
+                _, (_, freed) = self._items.popitem(last=False)
+                self.used -= freed
+        return value
+
+    def get(self, key, compute):
+        found, value = self.lookup(key)
+        if found:
+            return value
+        return self.store(key, compute())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "used_mb": round(self.used / 2**20, 2),
+                    "budget_mb": round(self.budget / 2**20, 2), "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource(show_spinner=False)
+def pipeline_memo() -> MemoGraph:
+    return MemoGraph(memo_budget())
+
+def node_key(stage: str, base, *params):
+    """Ключ узла от ключа входного кадра base; без base (None) узел не кэшируется."""
+    return None if base is None else (stage, base, *params)
+
+def node(key, compute):
+    """Результат узла key; compute() вызывается только при промахе."""
+    if key is None:
+        return compute()
+    return pipeline_memo().get(key, compute)
+
+def run_sections_memo(tasks: dict, keys: dict) -> dict:
+    """run_sections только для разделов без результата в графе; keys: раздел -> ключ узла."""
+    memo = pipeline_memo()
+    results, missing = {}, {}
+    for name, task in tasks.items():
+        key = keys.get(name)
+        found, value = memo.lookup(key) if key is not None else (False, None)
+        if found:
+            results[name] = value
+        else:
+            missing[name] = task
+    for name, value in run_sections(missing).items():
+        key = keys.get(name)
+        results[name] = memo.store(key, value) if key is not None else value
+    return {name: results[name] for name in tasks}
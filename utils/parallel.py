@@ -0,0 +1,119 @@
+import os
+import uuid
+import threading
+import tempfile
+import importlib
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+from utils.export import frame_fingerprint
+
+# Независимые тяжёлые расчёты разделов — в пул процессов.
+# Входные таблицы пишутся один раз в Arrow IPC в /dev/shm и открываются в воркерах
+# через memory map (без пиклинга кадров). Без пула (1 ядро, маленький набор,
+# MARTIN_APP_WORKERS=0) задачи выполняются здесь же, по очереди, через обычные кэши.
+
+PARALLEL_MIN_ROWS = 200_000
+MEMO_SIZE = 32
+
+@dataclass
+class Task:
+    """fn(*frames, *args); fn — функция уровня модуля (в воркере берётся её __wrapped__)."""
+    fn: object
+    frames: tuple
+    args: tuple = field(default_factory=tuple)
+
+def worker_count() -> int:
+    env = os.environ.get("MARTIN_APP_WORKERS")
+    if env is not None:
+        return max(0, int(env))
+    return min(4, (os.cpu_count() or 1) - 1)
+
+@st.cache_resource(show_spinner=False)
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: воркеры не наследуют потоки сервера Streamlit
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+@st.cache_resource(show_spinner=False)
+def _memo() -> OrderedDict:
+    # Результаты пула по (задача, отпечатки входов); st.cache_data внутри воркера не виден.
+    # Общий для всех сессий процесса: доступ только под _MEMO_LOCK
+    return OrderedDict()
+
+_MEMO_LOCK = threading.Lock()
+
+def _memo_get(key) -> tuple[bool, object]:
+    with _MEMO_LOCK:
+        memo = _memo()
+        if key in memo:
+            memo.move_to_end(key)
+            return True, memo[key]
+        return False, None
+
+def _memo_put(key, value):
+    with _MEMO_LOCK:
+        memo = _memo()
+        memo[key] = value
+        memo.move_to_end(key)
+        while len(memo) > MEMO_SIZE:
+            memo.popitem(last=False)
+
+def _shm_dir() -> str:
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def _share(df: pd.DataFrame) -> str:
+    path = os.path.join(_shm_dir(), f"martin_app_{uuid.uuid4().hex}.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return path
+
+def _open_shared(path: str) -> pd.DataFrame:
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+def _run(module: str, name: str, paths: tuple, args: tuple):
+    # Выполняется в воркере
+    fn = getattr(importlib.import_module(module), name)
+    fn = getattr(fn, "__wrapped__", fn)
+    return fn(*(_open_shared(p) for p in paths), *args)
+
+def run_sections(tasks: dict, min_rows: int = PARALLEL_MIN_ROWS) -> dict:
+    """
+    Имя раздела -> Task; возвращает имя -> результат. Задачи не зависят друг от друга.
+    В пул — только если самый большой входной кадр не меньше min_rows строк.
+    """
+    rows = max((len(f) for t in tasks.values() for f in t.frames), default=0)
+    workers = worker_count()
+    if workers < 1 or len(tasks) < 2 or rows < min_rows:
+        return {name: t.fn(*t.frames, *t.args) for name, t in tasks.items()}
+
+    results, pending, shared = {}, {}, {}
+    try:
+        for name, t in tasks.items():
+            fps = tuple(frame_fingerprint(f) for f in t.frames)
+            key = (t.fn.__module__, t.fn.__name__, fps, t.args)
+            found, value = _memo_get(key)
+            if found:
+                results[name] = value
+                continue
+            paths = []
+            for fp, frame in zip(fps, t.frames):
+                if fp not in shared:
+                    shared[fp] = _share(frame)
+                paths.append(shared[fp])
+            pending[name] = (key, _pool(workers).submit(_run, t.fn.__module__, t.fn.__name__, tuple(paths), t.args))
+        for name, (key, future) in pending.items():
+            results[name] = future.result()
+            _memo_put(key, results[name])
+    finally:
+        for path in shared.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return {name: results[name] for name in tasks}
@@ -0,0 +1,165 @@
+"""
+Предрасчёт таблиц дашборда для фильтров по умолчанию (все регионы/типы выигрыша,
+без фильтров по призам и сегментам, весь диапазон дат от START_FROM).
+
+    python -m utils.precompute --source qr_code.csv --out precomputed
+
+Запускается по расписанию (cron и т.п.). Дашборд берёт таблицы отсюда, если
+набор данных (имя, число строк и версия файла — mtime и размер, как у снимков)
+и фильтры совпадают с умолчанием, иначе считает вживую.
+"""
+import os
+import json
+import argparse
+import datetime as dt
+from pathlib import Path
+import streamlit as st
+import pandas as pd
+
+from utils.data import load_data, process_data, get_user_col, START_FROM_STR
+from utils.snapshot import source_version
+from utils.helpers import aggregate_time
+from utils.prizes import compute_prize_stats
+from utils.analytics import (
+    cohort_retention, claim_hours, rfm_table, user_activity_table,
+    key_metrics, pending_users_table, time_of_day,
+)
+
+PRECOMPUTED_DIR = "precomputed"
+MANIFEST = "manifest.json"
+GRANULARITIES = ["Day", "Week", "Month"]
+
+def default_work(df: pd.DataFrame, local_tz: str) -> pd.DataFrame:
+    """work при фильтрах по умолчанию: непустой win_date в local_tz, не раньше START_FROM."""
+    start = pd.Timestamp(START_FROM_STR, tz="UTC")
+    work = df.dropna(subset=["win_date"]).copy()
+    if local_tz != "UTC":
+        work["win_date"] = work["win_date"].dt.tz_convert(local_tz)
+        start = start.tz_convert(local_tz)
+    work = work[work["win_date"] >= start]
+    # Слайдер дат передаёт границы с точностью до микросекунд: нетронутый слайдер
+    # в дашборде отсекает строки позже max(win_date), округлённого вниз до 1 us
+    if not work.empty:
+        work = work[work["win_date"] <= work["win_date"].max().floor("us")]
+    return work
+
+def time_series_table(work: pd.DataFrame, user_col, local_tz: str) -> pd.DataFrame:
+    """Ряды событий и real prizes для всех гранулярностей и обоих режимов подсчёта."""
+    work_real = work[work["is_real_prize"]]
+    parts = []
+    for series, src in [("events", work), ("real", work_real)]:
+        for gran in GRANULARITIES:
+            for unique in [False, True]:
+                ts = aggregate_time(src, "win_date", gran, unique, local_tz, user_col)
+                parts.append(ts.assign(series=series, gran=gran, unique=unique))
+    return pd.concat(parts, ignore_index=True)
+
+def compute_default_tables(df: pd.DataFrame, user_col, local_tz: str) -> dict:
+    """Все таблицы дашборда для фильтров по умолчанию; df — результат process_data."""
+    work = default_work(df, local_tz)
+    hour_df, heat_df = time_of_day(work)
+    tables = {
+        "kpis": pd.DataFrame([key_metrics(work, user_col)]),
+        "timeseries": time_series_table(work, user_col, local_tz),
+        "hours": hour_df,
+        "heatmap": heat_df,
+        "prize_stats": compute_prize_stats(work),
+        # Advanced Analytics считается по всему отфильтрованному набору, без START_FROM
+        "prize_stats_all": compute_prize_stats(df),
+        "claim_hours": claim_hours(df[["is_real_prize", "is_win_received", "prize_receive_date", "win_date"]]).to_frame(),
+    }
+    if user_col:
+        tables["pending_users"] = pending_users_table(work, user_col)
+        tables["activity"] = user_activity_table(work, user_col, local_tz)
+        tables["rfm"] = rfm_table(df[[user_col, "win_date", "is_real_prize"]], user_col)
+        retention = cohort_retention(df[[user_col, "win_date"]], user_col, local_tz)
+        # Parquet требует строковые имена колонок
+        retention.columns = [str(c) for c in retention.columns]
+        tables["retention"] = retention.reset_index()
+    return tables
+
+def write_tables(tables: dict, out_dir: str, meta: dict):
+    """Parquet на таблицу + manifest.json; манифест пишется последним и атомарно."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for name, table in tables.items():
+        table.to_parquet(out / f"{name}.parquet", index=False)
+    manifest = dict(meta, tables=sorted(tables))
+    tmp = out / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.replace(tmp, out / MANIFEST)
+
+def read_manifest(out_dir: str = PRECOMPUTED_DIR) -> dict | None:
+    try:
+        return json.loads((Path(out_dir) / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+@st.cache_data(show_spinner=False)
+def load_tables(out_dir: str, built_at: str) -> dict:
+    """Таблицы предрасчёта; built_at в ключе кэша — новый прогон CLI перечитывается."""
+    manifest = read_manifest(out_dir) or {}
+    return restore_tables({name: pd.read_parquet(Path(out_dir) / f"{name}.parquet") for name in manifest.get("tables", [])})
+
+def restore_tables(tables: dict) -> dict:
+    """Таблицы compute_default_tables (или прочитанные из Parquet) в том виде, в каком их берут вкладки."""
+    tables = dict(tables)
+    if "retention" in tables:
+        retention = tables["retention"].set_index("cohort_week")
+        retention.columns = pd.Index([int(c) for c in retention.columns], name="weeks_since_first")
+        tables["retention"] = retention
+    if "claim_hours" in tables:
+        tables["claim_hours"] = tables["claim_hours"]["hours_to_claim"]
+    if "kpis" in tables:
+        kpi = tables["kpis"].iloc[0].to_dict()
+        tables["kpis"] = {k: (None if pd.isna(v) else int(v)) for k, v in kpi.items()}
+    return tables
+
+def precomputed_for(dataset_key, user_col, local_tz: str, version: str | None,
+                    out_dir: str = PRECOMPUTED_DIR) -> dict | None:
+    """
+    Таблицы предрасчёта, если они построены для этого набора, поля пользователя и пояса.
+    version — source_version файла, из которого построен набор (None — не файл по умолчанию).
+    """
+    manifest = read_manifest(out_dir)
+    if not manifest or version is None:
+        return None
+    if (manifest.get("dataset_key") != list(dataset_key)
+            or manifest.get("source_version") != version
+            or manifest.get("user_col") != user_col
+            or manifest.get("local_tz") != local_tz
+            or manifest.get("start_from") != START_FROM_STR):
+        return None
+    return load_tables(out_dir, manifest["built_at"])
+
+def time_series_from(pre: dict, series: str, gran: str, unique: bool) -> pd.DataFrame:
+    ts = pre["timeseries"]
+    ts = ts[(ts["series"] == series) & (ts["gran"] == gran) & (ts["unique"] == unique)]
+    return ts[["date", "count"]].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Предрасчёт таблиц дашборда для фильтров по умолчанию")
+    parser.add_argument("--source", default="qr_code.csv")
+    parser.add_argument("--out", default=PRECOMPUTED_DIR)
+    parser.add_argument("--tz", default="Asia/Yerevan", choices=["UTC", "Asia/Yerevan"])
+    args = parser.parse_args()
+
+    # версия до чтения: если файл поменяется во время расчёта, манифест просто не совпадёт
+    version = source_version(args.source)
+    raw_df = load_data(args.source)
+    df = process_data(raw_df.copy())
+    user_col = get_user_col(df)
+    tables = compute_default_tables(df, user_col, args.tz)
+    write_tables(tables, args.out, {
+        # тот же ключ, что строит app.py для файла по умолчанию
+        "dataset_key": [os.path.basename(args.source), len(raw_df)],
+        "source_version": version,
+        "user_col": user_col,
+        "local_tz": args.tz,
+        "start_from": START_FROM_STR,
+        "built_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+    })
+    print(f"{len(tables)} tables -> {args.out}")
+
+if __name__ == "__main__":
+    main()
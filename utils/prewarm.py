@@ -0,0 +1,139 @@
+"""
+Прогрев набора по умолчанию (qr_code.csv) в фоновом потоке сервера.
+
+Поток запускается первым прогоном скрипта в процессе (ещё на форме входа) и строит
+общий обработанный кадр, сегменты, словари и битовые индексы фильтров и таблицы вида
+по умолчанию (если нет подходящего предрасчёта на диске). Сессии берут опубликованную
+сборку; новая (изменился qr_code.csv или нажато «Обновить/очистить кэш данных»)
+собирается в фоне, а до её готовности сессии работают с предыдущей.
+
+Модуль лёгкий: тяжёлые импорты — внутри потока, форма входа их не ждёт.
+"""
+import os
+import logging
+import threading
+import streamlit as st
+
+logger = logging.getLogger("martin_app.prewarm")
+
+DEFAULT_SOURCE = "qr_code.csv"
+DEFAULT_TZ = "Asia/Yerevan"
+THREAD_NAME = "martin_app_prewarm"
+
+def warm_dataset(source: str, generation: int, local_tz: str = DEFAULT_TZ) -> dict:
+    """Строит всё, что нужно виду по умолчанию; кэши заполняются под version_key сборки."""
+    from utils.snapshot import source_version, load_processed
+    from utils.data import shared_dataset, shared_segments, get_user_col, filter_dictionaries
+    from utils.bitmaps import shared_bitmaps
+    from utils.precompute import compute_default_tables, precomputed_for, restore_tables
+
+    version = source_version(source)
+    # generation в ключе: пересборка после очистки кэша не задевает записи текущей сборки
+    version_key = (source, version, generation)
+    df = shared_dataset(version_key, lambda: load_processed(source, version))
+    user_col = get_user_col(df)
+    if user_col:
+        full = df.assign(user_segment=shared_segments(version_key, user_col, df[user_col]))
+    else:
+        full = df.assign(user_segment="Unknown")
+    filter_dictionaries(version_key, full)
+    shared_bitmaps(version_key, user_col, full)
+
+    tables = None
+    if precomputed_for((os.path.basename(source), len(df)), user_col, local_tz, version) is None:
+        tables = restore_tables(compute_default_tables(df, user_col, local_tz))
+    return {"source_version": version, "version_key": version_key, "df": df,
+            "user_col": user_col, "local_tz": local_tz, "tables": tables}
+
+class Prewarm:
+    """Опубликованная сборка набора по умолчанию и фоновая сборка следующей."""
+
+    def __init__(self, source: str = DEFAULT_SOURCE):
+        self.source = source
+        self.generation = 0
+        self.published = None
+        self.error = None
+        self.failed_version = None  # версия источника, на которой упала последняя сборка
+        self.disabled = False
+        self.pending_refresh = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def building(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def request(self, refresh: bool = False):
+        """Запускает сборку в фоне, если её ещё нет, источник изменился или refresh."""
+        with self._lock:
+            if self.disabled or not os.path.exists(self.source):
+                return
+            if self.building():
+                # идущая сборка могла начаться до изменения данных: пересобрать сразу после неё
+                self.pending_refresh = self.pending_refresh or refresh
+                return
+            if refresh:
+                self.generation += 1
+            elif self.published is not None or self.error is not None:
+                from utils.snapshot import source_version
+                version = source_version(self.source)
+                if version == self.failed_version:
+                    # сборка этой версии уже падала: не повторять её на каждом прогоне,
+                    # ждать следующего изменения источника или явного refresh
+                    return
+                if self.published is not None and self.published["source_version"] == version:
+                    return
+            self._start()
+
+    def _start(self):
+        # вызывается под self._lock
+        self._thread = threading.Thread(target=self._build, args=(self.generation,),
+                                        name=THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def _build(self, generation: int):
+        from utils.store import store_exists
+        if store_exists():
+            # дашборд читает хранилище по разделам (utils.store), а не qr_code.csv
+            self.disabled = True
+            return
+        from utils.snapshot import source_version
+        version = error = None
+        try:
+            # версия до чтения: если файл меняется во время сборки, следующий запрос её повторит
+            version = source_version(self.source)
+            published = warm_dataset(self.source, generation)
+        except Exception as e:
+            logger.exception("prewarm failed")
+            published, error = None, e
+        with self._lock:
+            if published is None:
+                self.error, self.failed_version = error, version
+            else:
+                self.published, self.error, self.failed_version = published, None, None
+                logger.info("prewarm ready: %s", published["version_key"])
+            if self.pending_refresh and os.path.exists(self.source):
+                # «Обновить/очистить кэш данных» нажали во время этой сборки
+                self.pending_refresh = False
+                self.generation += 1
+                self._start()
+
+    def current(self) -> dict | None:
+        """Опубликованная сборка; если её ещё нет, а первая сборка идёт — ждём её."""
+        thread = self._thread
+        if self.published is None and thread is not None:
+            thread.join()
+        return self.published
+
+    def tables_for(self, version_key, user_col, local_tz: str) -> dict | None:
+        """Таблицы вида по умолчанию из опубликованной сборки, если они для этих параметров."""
+        p = self.published
+        if p is None or p["tables"] is None:
+            return None
+        if (p["version_key"], p["user_col"], p["local_tz"]) != (version_key, user_col, local_tz):
+            return None
+        return p["tables"]
+
+@st.cache_resource(show_spinner=False)
+def server_prewarm() -> Prewarm:
+    """Один прогрев на процесс сервера."""
+    return Prewarm(DEFAULT_SOURCE)
@@ -0,0 +1,72 @@
+import streamlit as st
+import pandas as pd
+from utils.helpers import wilson_interval
+
+# Разрезы, которые поддерживает ядро статистики призов
+PRIZE_SLICES = {
+    "region": "region_name",
+    "week": "week",
+}
+
+_KERNEL_COLS = ["prize_id", "is_real_prize", "is_real_prize_received"]
+
+@st.cache_data(show_spinner=False)
+def _prize_stats_cached(slim: pd.DataFrame, keys: tuple) -> pd.DataFrame:
+    # Один сгруппированный проход: prize_id=NA попадает в группу, чтобы получить знаменатель сканов
+    grouped = slim.groupby(list(keys) + ["prize_id"], dropna=False, observed=True).agg(
+        scans=("is_real_prize", "size"),
+        real_prize_count=("is_real_prize", "sum"),
+        received_count=("is_real_prize_received", "sum"),
+    ).reset_index()
+
+    if keys:
+        grouped["scans_total"] = grouped.groupby(list(keys), dropna=False)["scans"].transform("sum")
+    else:
+        grouped["scans_total"] = grouped["scans"].sum()
+
+    out = grouped[grouped["prize_id"].notna() & (grouped["real_prize_count"] > 0)].copy()
+    out["real_prize_count"] = out["real_prize_count"].astype(int)
+    out["received_count"] = out["received_count"].astype(int)
+    out["pending_count"] = out["real_prize_count"] - out["received_count"]
+
+    if keys:
+        real_total = out.groupby(list(keys), dropna=False)["real_prize_count"].transform("sum")
+    else:
+        real_total = out["real_prize_count"].sum()
+
+    scans_total = out["scans_total"].clip(lower=1)
+    out["p_per_scan"] = out["real_prize_count"] / scans_total
+    out["share_among_real"] = out["real_prize_count"] / pd.Series(real_total, index=out.index).clip(lower=1)
+    out["received_share_in_prize"] = out["received_count"] / out["real_prize_count"]
+    out["unclaimed_rate"] = out["pending_count"] / out["real_prize_count"]
+
+    out["p_per_scan_ci_low"], out["p_per_scan_ci_high"] = wilson_interval(out["real_prize_count"], out["scans_total"])
+    out["unclaimed_ci_low"], out["unclaimed_ci_high"] = wilson_interval(out["pending_count"], out["real_prize_count"])
+
+    out = out.drop(columns=["scans", "scans_total"])
+    sort_cols = list(keys) + ["real_prize_count"]
+    return out.sort_values(sort_cols, ascending=[True] * len(keys) + [False]).reset_index(drop=True)
+
+def compute_prize_stats(df: pd.DataFrame, by: tuple = ()) -> pd.DataFrame:
+    """
+    Статистика по prize_id за один проход: выиграно, выдано, ожидает, p_per_scan,
+    share_among_real, unclaimed_rate и интервалы Уилсона.
+    by — необязательный разрез: ("region",), ("week",) или оба.
+    """
+    cols = ["prize_id", "real_prize_count", "received_count", "pending_count", "p_per_scan",
+            "share_among_real", "received_share_in_prize", "unclaimed_rate",
+            "p_per_scan_ci_low", "p_per_scan_ci_high", "unclaimed_ci_low", "unclaimed_ci_high"]
+    if df.empty or "prize_id" not in df.columns:
+        return pd.DataFrame(columns=[PRIZE_SLICES[b] for b in by] + cols)
+
+    keys = tuple(PRIZE_SLICES[b] for b in by)
+    slim = df[[c for c in _KERNEL_COLS + ["region_name"] if c in df.columns]].copy()
+    if "week" in keys:
+        s = df["win_date"]
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_localize(None)
+        slim["week"] = s.dt.to_period("W").dt.start_time
+    slim = slim[[*keys, *_KERNEL_COLS]]
+
+    out = _prize_stats_cached(slim, keys)
+    return out[list(keys) + cols]
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+import streamlit as st
+import pandas as pd
+
+# Лёгкая инструментовка горячих этапов: время, строки на входе/выходе и прирост RSS.
+# Записи копятся на текущий прогон скрипта (поток сессии Streamlit) и пишутся
+# в лог "martin_app.profile" одной JSON-строкой на этап; вывод в stderr включается
+# переменной окружения MARTIN_APP_PROFILE_LOG=1 (иначе записи видны только в debug-панели).
+
+logger = logging.getLogger("martin_app.profile")
+if os.environ.get("MARTIN_APP_PROFILE_LOG") == "1" and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_state = threading.local()
+
+def _records() -> list:
+    if not hasattr(_state, "records"):
+        _state.records = []
+    return _state.records
+
+def _rss_bytes() -> int | None:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def _rows(obj) -> int | None:
+    return len(obj) if isinstance(obj, (pd.DataFrame, pd.Series)) else None
+
+def start_run():
+    """Начало нового прогона: сбрасывает накопленные записи."""
+    _state.records = []
+    _state.laps = None
+    _state.t0 = time.perf_counter()
+
+def get_records() -> list[dict]:
+    return list(_records())
+
+@contextmanager
+def timed(stage: str, rows_in: int | None = None):
+    """
+    Замер этапа. Внутри блока можно заполнить rec["rows_out"]:
+        with timed("filter.region", rows_in=len(df)) as rec:
+            df = ...
+            rec["rows_out"] = len(df)
+    """
+    rec = {"stage": stage, "rows_in": rows_in, "rows_out": None}
+    rss0 = _rss_bytes()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["wall_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        rss1 = _rss_bytes()
+        rec["mem_delta_mb"] = round((rss1 - rss0) / 2**20, 2) if rss0 is not None and rss1 is not None else None
+        _records().append(rec)
+        logger.info(json.dumps(rec, ensure_ascii=False))
+
+def profiled(stage: str):
+    """Декоратор: замер вызова; rows_in — длина первого DataFrame-аргумента."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            first = next((a for a in list(args) + list(kwargs.values()) if isinstance(a, pd.DataFrame)), None)
+            with timed(stage, rows_in=_rows(first)) as rec:
+                result = fn(*args, **kwargs)
+                rec["rows_out"] = _rows(result)
+            return result
+        return wrapper
+    return deco
+
+class _Laps:
+    # Последовательные секции: lap() закрывает предыдущую и открывает новую
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._cm = None
+
+    def lap(self, name: str):
+        self.close()
+        self._cm = timed(f"{self.prefix}.{name}")
+        self._cm.__enter__()
+
+    def close(self):
+        if self._cm is not None:
+            self._cm.__exit__(None, None, None)
+            self._cm = None
+
+@contextmanager
+def section_laps(prefix: str):
+    """Область, внутри которой lap(name) размечает секции (например, subheader вкладки)."""
+    laps = _Laps(prefix)
+    prev = getattr(_state, "laps", None)
+    _state.laps = laps
+    try:
+        yield laps
+    finally:
+        laps.close()
+        _state.laps = prev
+
+def lap(name: str):
+    """Начать новую секцию в текущей section_laps; вне её — ничего не делает."""
+    laps = getattr(_state, "laps", None)
+    if laps is not None:
+        laps.lap(name)
+
+def render_profile_panel():
+    """Таблица этапов текущего прогона (для debug-панели)."""
+    records = get_records()
+    if not records:
+        st.caption("Нет замеров в этом прогоне.")
+        return
+    prof = pd.DataFrame(records)[["stage", "wall_ms", "rows_in", "rows_out", "mem_delta_mb"]]
+    st.dataframe(prof, use_container_width=True, hide_index=True)
+    t0 = getattr(_state, "t0", None)
+    if t0 is not None:
+        # этапы вложены (aggregate_time внутри секции), поэтому показываем общее время прогона
+        st.caption(f"Прогон до панели: {(time.perf_counter() - t0) * 1000:.0f} ms")
@@ -0,0 +1,127 @@
+"""
+Снимок обработанного набора (process_data) в Arrow IPC для нескольких серверных процессов.
+
+    snapshots/processed-<версия>.arrow   — сам снимок (без сжатия, читается через mmap)
+    snapshots/CURRENT                    — JSON: имя файла и версия источника
+
+Первый процесс, увидевший новую версию qr_code.csv, обрабатывает её и публикует снимок;
+остальные открывают файл через memory map (общий page cache вместо N копий).
+CURRENT заменяется атомарно (os.replace), поэтому читатель видит либо старый, либо новый снимок.
+
+    python -m utils.snapshot --source qr_code.csv
+"""
+import os
+import json
+import argparse
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+from utils.data import process_data
+
+try:
+    import fcntl
+except ImportError:  # Windows: снимки не публикуются, каждый процесс работает со своей копией
+    fcntl = None
+
+SNAPSHOT_DIR = "snapshots"
+CURRENT = "CURRENT"
+KEEP_SNAPSHOTS = 2
+# Меняется, когда меняется результат process_data (например, порядок строк)
+SNAPSHOT_FORMAT = 2
+LOCK = ".lock"
+
+def source_version(source: str) -> str:
+    st_ = os.stat(source)
+    return f"{st_.st_mtime_ns}-{st_.st_size}"
+
+def current_snapshot(source: str, root: str = SNAPSHOT_DIR) -> dict | None:
+    """Описание снимка из CURRENT, если он построен из текущей версии source."""
+    try:
+        info = json.loads((Path(root) / CURRENT).read_text())
+    except (OSError, ValueError):
+        return None
+    if info.get("source") != os.path.basename(source) or info.get("source_version") != source_version(source):
+        return None
+    if info.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if not (Path(root) / info["file"]).exists():
+        return None
+    return info
+
+def read_snapshot(info: dict, root: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """Снимок через memory map; колонки без пропусков numpy-типов не копируются."""
+    source = pa.memory_map(str(Path(root) / info["file"]), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+def _try_lock(out: Path) -> int | None:
+    """
+    Эксклюзивный flock на snapshots/.lock без ожидания; блокировку держит возвращённый fd.
+    ОС снимает её, когда процесс умирает, поэтому брошенных блокировок не бывает.
+    Файл не удаляется: новый inode под тем же именем дал бы второй «эксклюзивный» lock.
+    """
+    if fcntl is None:
+        return None
+    fd = os.open(out / LOCK, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+def write_snapshot(df: pd.DataFrame, source: str, version: str, root: str = SNAPSHOT_DIR) -> dict | None:
+    """
+    Публикует снимок версии version. Пока один процесс пишет (flock, см. _try_lock),
+    другие не ждут и работают со своей копией. Возвращает описание или None.
+    """
+    out = Path(root)
+    out.mkdir(parents=True, exist_ok=True)
+    fd = _try_lock(out)
+    if fd is None:
+        return None
+    try:
+        # под блокировкой других писателей нет: временные файлы — остатки умерших процессов
+        for leftover in [*out.glob("*.tmp-*"), *out.glob(".lock-*")]:
+            leftover.unlink(missing_ok=True)
+        name = f"processed-{version}-f{SNAPSHOT_FORMAT}.arrow"
+        tmp = out / f"{name}.tmp-{os.getpid()}"
+        # индекс — исходные номера строк (process_data сортирует по win_date)
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, out / name)
+
+        info = {"file": name, "source": os.path.basename(source), "source_version": version,
+                "format": SNAPSHOT_FORMAT, "rows": len(df)}
+        tmp_current = out / f"{CURRENT}.tmp-{os.getpid()}"
+        tmp_current.write_text(json.dumps(info, ensure_ascii=False))
+        os.replace(tmp_current, out / CURRENT)
+
+        # старые снимки: процессы, которые их ещё держат в mmap, дочитают (inode живёт до закрытия)
+        old = sorted(out.glob("processed-*.arrow"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in old[KEEP_SNAPSHOTS:]:
+            path.unlink(missing_ok=True)
+        return info
+    finally:
+        os.close(fd)
+
+def load_processed(source: str, version: str, root: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """Обработанный набор версии version: из снимка, если он уже опубликован, иначе обработка и публикация."""
+    info = current_snapshot(source, root)
+    if info is not None and info["source_version"] == version:
+        return read_snapshot(info, root)
+    df = process_data(pd.read_csv(source))
+    write_snapshot(df, source, version, root)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок обработанного набора в Arrow IPC")
+    parser.add_argument("--source", default="qr_code.csv")
+    parser.add_argument("--out", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+    info = write_snapshot(process_data(pd.read_csv(args.source)), args.source, source_version(args.source), args.out)
+    print(info or "другой процесс уже пишет этот снимок")
+
+if __name__ == "__main__":
+    main()
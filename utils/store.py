@@ -0,0 +1,164 @@
+"""
+Хранилище событий на диске: Parquet, hive-разбиение по месяцу win_date (UTC) и region_id.
+
+    qr_store/win_month=2025-09/region_id=2/part-0.parquet
+
+    python -m utils.store --source qr_code.csv --out qr_store
+
+Загрузка читает только разделы, пересекающие окно дат и выбранные регионы;
+границы окна берутся из статистик Parquet (min/max win_date), без чтения данных.
+Строки без win_date лежат в win_month=none и в окно не попадают.
+
+Показатели по всей истории пользователя не должны зависеть от того, какие разделы
+загружены: число сканов по каждому полю-кандидату в id пользователя считается при
+раскладке (_users/<поле>.parquet), из него строятся сегменты.
+"""
+import json
+import shutil
+import argparse
+import datetime as dt
+from pathlib import Path
+import streamlit as st
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.data import load_data, process_data, user_id_columns, REGION_MAP
+
+STORE_DIR = "qr_store"
+META = "_meta.json"
+USERS = "_users"
+NO_VALUE = "none"
+# Меняется вместе с раскладкой; хранилище другого формата не используется (пересобрать)
+STORE_FORMAT = 2
+
+def store_exists(root: str = STORE_DIR) -> bool:
+    try:
+        return read_meta(root).get("format") == STORE_FORMAT
+    except (OSError, ValueError):
+        return False
+
+def write_store(raw: pd.DataFrame, root: str = STORE_DIR):
+    """Раскладывает сырые строки (как из CSV) по разделам; старое хранилище заменяется."""
+    out = Path(root)
+    tmp = out.with_name(out.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+
+    win = pd.to_datetime(raw["win_date"], errors="coerce", utc=True)
+    data = raw.assign(win_date=win)
+    month = win.dt.strftime("%Y-%m").fillna(NO_VALUE)
+    for (m, rid), part in data.groupby([month, data["region_id"]], sort=True, dropna=False):
+        part_dir = tmp / f"win_month={m}" / f"region_id={NO_VALUE if pd.isna(rid) else rid}"
+        part_dir.mkdir(parents=True)
+        # region_id задаётся каталогом и в файл не пишется
+        part.drop(columns=["region_id"]).to_parquet(part_dir / "part-0.parquet", index=False)
+
+    # сканы по пользователю за всю историю — по значениям после process_data, как их видит app.py
+    users = tmp / USERS
+    users.mkdir()
+    ids = process_data(raw.copy())
+    for col in user_id_columns(raw.columns):
+        counts = ids[col].value_counts().rename("scans")
+        counts.rename_axis(col).reset_index().to_parquet(users / f"{col}.parquet", index=False)
+
+    meta = {
+        "format": STORE_FORMAT,
+        "columns": list(raw.columns),
+        "region_dtype": str(raw["region_id"].dtype),
+        "rows": len(raw),
+        "built_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+    }
+    (tmp / META).write_text(json.dumps(meta, ensure_ascii=False, indent=2))
+    if out.exists() and (out / META).exists():
+        shutil.rmtree(out)
+    tmp.rename(out)
+
+def read_meta(root: str = STORE_DIR) -> dict:
+    return json.loads((Path(root) / META).read_text())
+
+@st.cache_data(show_spinner=False)
+def store_index(root: str, built_at: str) -> pd.DataFrame:
+    """Разделы хранилища: месяц, region_id, путь, строки и min/max win_date из футера Parquet."""
+    rows = []
+    for path in sorted(Path(root).glob("win_month=*/region_id=*/*.parquet")):
+        month = path.parent.parent.name.split("=", 1)[1]
+        rid = path.parent.name.split("=", 1)[1]
+        meta = pq.ParquetFile(path).metadata
+        col = meta.schema.to_arrow_schema().get_field_index("win_date")
+        lo, hi = None, None
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(col).statistics
+            if stats is not None and stats.has_min_max:
+                lo = stats.min if lo is None else min(lo, stats.min)
+                hi = stats.max if hi is None else max(hi, stats.max)
+        rows.append({"win_month": month, "region_id": rid, "path": str(path),
+                     "rows": meta.num_rows, "win_min": lo, "win_max": hi})
+    index = pd.DataFrame(rows, columns=["win_month", "region_id", "path", "rows", "win_min", "win_max"])
+    for c in ["win_min", "win_max"]:
+        index[c] = pd.to_datetime(index[c], utc=True)
+    return index
+
+def prune(index: pd.DataFrame, start=None, end=None, region_ids=None, undated: bool = False) -> pd.DataFrame:
+    """
+    Разделы, пересекающие [start, end] по win_date и входящие в region_ids (None = все).
+    undated=True добавляет win_month=none (только без границ дат).
+    """
+    keep = index["win_month"] != NO_VALUE
+    if undated and start is None and end is None:
+        keep |= index["win_month"] == NO_VALUE
+    if start is not None:
+        keep &= index["win_max"] >= start
+    if end is not None:
+        keep &= index["win_min"] <= end
+    if region_ids is not None:
+        keep &= index["region_id"].isin([str(r) for r in region_ids])
+    return index[keep]
+
+def region_names(index: pd.DataFrame) -> dict:
+    """Подпись региона (как region_name в process_data) -> значения region_id разделов."""
+    names = {}
+    for rid in sorted(index["region_id"].unique()):
+        if rid == NO_VALUE:
+            continue
+        num = pd.to_numeric(rid)
+        names.setdefault(REGION_MAP.get(num, str(num)), []).append(rid)
+    return dict(sorted(names.items()))
+
+def user_scan_counts(root: str, user_col: str) -> pd.Series | None:
+    """Сканы по пользователю (значение user_col -> число строк) во всём хранилище."""
+    path = Path(root) / USERS / f"{user_col}.parquet"
+    if not path.exists():
+        return None
+    counts = pd.read_parquet(path)
+    return counts.set_index(user_col)["scans"]
+
+def load_partitions(root: str, paths: tuple) -> pd.DataFrame:
+    """
+    Сырые строки выбранных разделов с исходным набором и порядком колонок.
+    Не кэшируется: результат сразу уходит в общий набор utils.data.shared_dataset.
+    """
+    meta = read_meta(root)
+    parts = []
+    for p in paths:
+        part = pd.read_parquet(p)
+        rid = Path(p).parent.name.split("=", 1)[1]
+        part["region_id"] = pd.to_numeric(pd.Series(None if rid == NO_VALUE else rid, index=part.index))
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=meta["columns"])
+    raw = pd.concat(parts, ignore_index=True)
+    if not raw["region_id"].isna().any():
+        raw["region_id"] = raw["region_id"].astype(meta["region_dtype"])
+    return raw[meta["columns"]]
+
+def main():
+    parser = argparse.ArgumentParser(description="Раскладка qr_code по разделам Parquet (месяц win_date × region_id)")
+    parser.add_argument("--source", default="qr_code.csv")
+    parser.add_argument("--out", default=STORE_DIR)
+    args = parser.parse_args()
+    raw = load_data(args.source)
+    write_store(raw, args.out)
+    print(f"{len(raw)} rows -> {args.out}")
+
+if __name__ == "__main__":
+    main()
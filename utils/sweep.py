@@ -0,0 +1,89 @@
+"""
+Перебор двух параметров симулятора гуся (страница Simulator, вкладка «Сетка параметров»).
+
+Сетка scenario_grid режется на куски по числу воркеров и считается simulate_goose_batch
+в пуле процессов (utils.parallel.run_sections). Итог кэшируется по конфигурации этапов,
+осям и режимам: смена оси или этапа пересчитывает только новую сетку.
+"""
+from dataclasses import astuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.goose import StageSpec, STAGE_ORDER, scenario_grid, simulate_goose_batch
+from utils.parallel import Task, run_sections, worker_count
+
+# Ось -> (подпись, целочисленная, (от, до, шаг) по умолчанию, (мин, макс) — пределы как в сайдбаре)
+SWEEP_AXES = {
+    "weekly_pts": ("Недельное значение", False, (0.5, 20.0, 0.5), (0.0, 1000.0)),
+    "max_paid_feeds_per_day": ("Макс платных кормлений в день", True, (0, 20, 1), (0, 50)),
+}
+_STAGE_AXES = {
+    "hunger_cap": ("hunger cap", (1, 20, 1), (1, 100)),
+    "size_cap": ("size cap", (1, 30, 1), (1, 200)),
+    "daily_hunger_loss": ("daily loss", (0, 5, 1), (0, 10)),
+    "stageup_bonus_pts": ("бонус за stage-up", (0, 20, 1), (0, 100)),
+}
+_ADULT_MAX = {"hunger_cap": 200, "size_cap": 300}  # у взрослого этапа в сайдбаре пределы шире
+for _stage in STAGE_ORDER:
+    for _field, (_label, _default, (_min, _max)) in _STAGE_AXES.items():
+        if _stage == "adult" and _field == "stageup_bonus_pts":
+            continue  # у последнего этапа перехода нет
+        if _stage == "adult":
+            _max = _ADULT_MAX.get(_field, _max)
+        SWEEP_AXES[f"{_stage}_{_field}"] = (f"{_stage.capitalize()} {_label}", True, _default, (_min, _max))
+
+SWEEP_METRICS = {
+    "reached_medium_on_day": "Дней до Medium",
+    "reached_adult_on_day": "Дней до Adult",
+    "died_on_day": "Смерть на дне",
+    "total_paid_spent": "Потрачено очков",
+}
+
+SWEEP_MAX_CELLS = 10_000
+SWEEP_PARALLEL_MIN = 2_000  # сценариев; меньшую сетку пул не ускоряет
+
+def axis_values(axis: str, start: float, stop: float, step: float) -> tuple:
+    """Значения оси от start до stop включительно с шагом step."""
+    if step <= 0 or stop < start:
+        return (start,)
+    values = np.arange(start, stop + step / 2, step)
+    if SWEEP_AXES[axis][1]:
+        return tuple(int(v) for v in np.unique(np.round(values)))
+    return tuple(float(v) for v in np.round(values, 6))
+
+def stage_key(stages: dict[str, StageSpec]) -> tuple:
+    """Хешируемая конфигурация этапов для ключа кэша."""
+    return tuple(astuple(stages[s]) for s in STAGE_ORDER)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def sweep_goose(
+    stage_params: tuple,
+    weekly_pts: float,
+    max_paid_feeds_per_day: int,
+    x_axis: str,
+    x_values: tuple,
+    y_axis: str,
+    y_values: tuple,
+    accrual_mode: str = "daily",
+    weekly_value_mode: str = "points",
+    start_hunger: int = 3,
+    start_size: int = 1,
+    visit_daily: bool = True,
+    add_stageup_bonus_to_wallet: bool = True,
+    max_days: int = 365
+) -> pd.DataFrame:
+    """Оси x_axis, y_axis и поля summary по сетке; остальные параметры — как переданы."""
+    stages = {p[0]: StageSpec(*p) for p in stage_params}
+    axes = {"weekly_pts": [weekly_pts], "max_paid_feeds_per_day": [max_paid_feeds_per_day],
+            x_axis: list(x_values), y_axis: list(y_values)}
+    grid = scenario_grid(stages, **axes)
+
+    args = (accrual_mode, weekly_value_mode, "small", start_hunger, start_size, visit_daily,
+            add_stageup_bonus_to_wallet, max_days)
+    parts = max(2, worker_count()) if len(grid) >= SWEEP_PARALLEL_MIN else 1
+    bounds = np.linspace(0, len(grid), parts + 1).astype(int)
+    tasks = {i: Task(simulate_goose_batch, (grid.iloc[lo:hi],), args)
+             for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))}
+    results = run_sections(tasks, min_rows=0)
+    summary = pd.concat([results[i] for i in tasks])
+    return grid[[x_axis, y_axis]].join(summary)
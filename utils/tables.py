@@ -0,0 +1,69 @@
+import math
+import numpy as np
+import streamlit as st
+import pandas as pd
+from utils.export import frame_fingerprint
+
+# Постраничные таблицы: сортировка, фильтр и пагинация на сервере,
+# во фронтенд уходит только текущая страница.
+
+DEFAULT_PAGE_SIZE = 50
+
+def table_positions(df: pd.DataFrame, sort_col: str | None, ascending: bool, query: str = "") -> np.ndarray:
+    """Позиции строк после фильтра по подстроке и стабильной сортировки."""
+    positions = np.arange(len(df))
+    query = query.strip()
+    if query:
+        text_cols = [df.columns[0]] + [c for c in df.columns[1:]
+                                       if pd.api.types.is_string_dtype(df[c]) or df[c].dtype == object]
+        mask = np.zeros(len(df), dtype=bool)
+        for c in dict.fromkeys(text_cols):
+            mask |= df[c].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+        positions = positions[mask]
+    if sort_col is not None and len(positions):
+        col = df[sort_col].iloc[positions].reset_index(drop=True)
+        order = col.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        positions = positions[order]
+    return positions
+
+def _cached_positions(df, key, data_key, sort_col, ascending, query) -> np.ndarray:
+    # Порядок строк живёт в session_state, пока не сменилась таблица или настройки;
+    # перелистывание — срез iloc. Таблицу узнаём по data_key вызывающего (без хеширования
+    # на каждом прогоне), без него — по отпечатку содержимого (id(df) не годится:
+    # пересобранный кадр может получить адрес старого)
+    state_key = f"{key}_positions"
+    memo_key = (frame_fingerprint(df) if data_key is None else data_key, sort_col, ascending, query)
+    cached = st.session_state.get(state_key)
+    if cached is not None and cached[0] == memo_key:
+        return cached[1]
+    positions = table_positions(df, sort_col, ascending, query)
+    st.session_state[state_key] = (memo_key, positions)
+    return positions
+
+@st.fragment
+def paged_table(df: pd.DataFrame, key: str, sort_by: str | None = None, ascending: bool = False,
+                page_size: int = DEFAULT_PAGE_SIZE, height: int | None = None, data_key=None):
+    """
+    Таблица с серверной сортировкой, фильтром и пагинацией.
+    data_key — ключ содержимого df (узел мемо-графа, версия предрасчёта); None — отпечаток df.
+    """
+    if df.empty:
+        st.dataframe(df, use_container_width=True)
+        return
+
+    cols = list(df.columns)
+    c_sort, c_asc, c_filter, c_page = st.columns([2, 1, 2, 1])
+    sort_col = c_sort.selectbox("Сортировка", cols, index=cols.index(sort_by) if sort_by in cols else 0,
+                                key=f"{key}_sort")
+    asc = c_asc.toggle("По возрастанию", value=ascending, key=f"{key}_asc")
+    query = c_filter.text_input("Фильтр (подстрока)", key=f"{key}_filter")
+
+    positions = _cached_positions(df, key, data_key, sort_col, asc, query)
+    pages = max(1, math.ceil(len(positions) / page_size))
+    page = int(c_page.number_input(f"Страница (из {pages})", min_value=1, value=1, step=1, key=f"{key}_page"))
+    page = min(page, pages)
+
+    view = df.iloc[positions[(page - 1) * page_size: page * page_size]]
+    extra = {"height": height} if height else {}
+    st.dataframe(view, use_container_width=True, hide_index=True, **extra)
+    st.caption(f"Строк: {len(positions)} из {len(df)} · страница {page}/{pages}")
@@ -0,0 +1,101 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+PHONE_COLS = ["phone", "msisdn", "phone_number"]
+
+@dataclass
+class UserIndex:
+    """
+    Индекс строк по пользователю: строки сгруппированы по id (внутри — по win_date),
+    offsets[i]:offsets[i+1] — позиции строк пользователя ids[i] в order.
+    """
+    ids: pd.Index
+    order: np.ndarray
+    offsets: np.ndarray
+    id_str: np.ndarray
+    sorted_pos: np.ndarray
+    sorted_str: np.ndarray
+    phone_str: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, user_id) -> np.ndarray:
+        """Позиционные индексы строк пользователя (O(k))."""
+        try:
+            i = self.ids.get_loc(user_id)
+        except KeyError:
+            return np.empty(0, dtype=np.int64)
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def resolve(self, text: str):
+        """Точное совпадение введённой строки с id (с учётом числовых id)."""
+        text = text.strip()
+        i = np.searchsorted(self.sorted_str, text, side="left")
+        if i < len(self.sorted_str) and self.sorted_str[i] == text:
+            return self.ids[self.sorted_pos[i]]
+        return None
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """
+        Первые limit совпадений: сначала по префиксу id (бинпоиск по отсортированным строкам),
+        затем по подстроке в id и телефоне.
+        """
+        query = query.strip()
+        if not query:
+            return list(self.ids[self.sorted_pos[:limit]])
+
+        lo = np.searchsorted(self.sorted_str, query, side="left")
+        hi = np.searchsorted(self.sorted_str, query + "\uffff", side="left")
+        hits = list(self.sorted_pos[lo:min(hi, lo + limit)])
+
+        if len(hits) < limit:
+            mask = np.char.find(self.id_str, query) >= 0
+            if self.phone_str is not None:
+                mask |= np.char.find(self.phone_str, query) >= 0
+            seen = set(hits)
+            for i in np.flatnonzero(mask):
+                if i not in seen:
+                    hits.append(i)
+                    if len(hits) >= limit:
+                        break
+        return list(self.ids[np.asarray(hits, dtype=np.int64)])
+
+@st.cache_data(show_spinner=False)
+def build_user_index(df: pd.DataFrame, user_col: str) -> UserIndex:
+    """Строит UserIndex по колонке user_col (позиции — относительно df)."""
+    codes, uniques = pd.factorize(df[user_col], sort=True)
+    valid = codes >= 0
+
+    if "win_date" in df.columns:
+        t = df["win_date"].array.asi8
+        order = np.lexsort((t, codes))
+    else:
+        order = np.argsort(codes, kind="stable")
+    order = order[valid[order]]
+
+    counts = np.bincount(codes[valid], minlength=len(uniques))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    ids = pd.Index(uniques)
+    id_str = ids.astype(str).to_numpy(dtype=str)
+
+    phone_str = None
+    phone_col = next((c for c in PHONE_COLS if c in df.columns and c != user_col), None)
+    if phone_col:
+        phones = df.loc[valid, [phone_col]].assign(_code=codes[valid]).dropna()
+        phones = phones.drop_duplicates("_code").set_index("_code")[phone_col]
+        phone_str = phones.reindex(range(len(uniques))).fillna("").astype(str).to_numpy(dtype=str)
+
+    sorted_pos = np.argsort(id_str, kind="stable")
+    return UserIndex(
+        ids=ids,
+        order=order.astype(np.int64),
+        offsets=offsets.astype(np.int64),
+        id_str=id_str,
+        sorted_pos=sorted_pos,
+        sorted_str=id_str[sorted_pos],
+        phone_str=phone_str,
+    )